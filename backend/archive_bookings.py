@@ -0,0 +1,38 @@
+import argparse
+from dotenv import load_dotenv
+from config.database import ensure_schema
+from models.booking_archive import BookingArchive
+from models.trip_inventory import TripInventory
+
+load_dotenv()
+
+def archive_bookings(days=None, batch_size=1000, partition=True):
+    ensure_schema()
+
+    if partition:
+        created = BookingArchive.ensure_partitions()
+        if created:
+            print(f"Created booking partitions: {', '.join(created)}")
+
+    before = BookingArchive.cutoff(days)
+    print(f"Archiving bookings for trips before {before}")
+    moved = BookingArchive.archive(before, batch_size)
+    print(f"Moved {moved} bookings to bookings_archive.")
+
+    dropped = BookingArchive.drop_archived_partitions(before)
+    if dropped:
+        print(f"Dropped archived partitions: {', '.join(dropped)}")
+
+    # Seat counts only matter until departure
+    holds = TripInventory.purge_before(BookingArchive.cutoff(0))
+    print(f"Removed seat inventory for departed trips ({holds} leftover holds).")
+
+if __name__ == "__main__":
+    # Meant to run daily from cron or a scheduled job
+    parser = argparse.ArgumentParser(description="Move past trips out of the bookings table")
+    parser.add_argument("--days", type=int, help="archive trips older than this many days (BOOKING_ARCHIVE_AFTER_DAYS)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--no-partition", dest="partition", action="store_false",
+                        help="skip creating MySQL partitions (the first run converts bookings, which rewrites the table)")
+    args = parser.parse_args()
+    archive_bookings(args.days, args.batch_size, args.partition)
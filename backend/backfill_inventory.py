@@ -0,0 +1,16 @@
+from dotenv import load_dotenv
+from config.database import ensure_schema
+from models.trip_inventory import TripInventory
+
+load_dotenv()
+
+def backfill_inventory():
+    ensure_schema()
+
+    print("Recounting reserved seats from confirmed bookings and live holds...")
+    trips = TripInventory.rebuild()
+    print(f"Updated {trips} trips.")
+
+if __name__ == "__main__":
+    # Run once after upgrading a database that already has bookings
+    backfill_inventory()
@@ -0,0 +1,49 @@
+import os
+
+
+def create_backend(name=None, **options):
+    """Build the storage backend selected by DB_BACKEND (mysql or sqlite)"""
+    name = (name or os.getenv("DB_BACKEND", "mysql")).strip().lower()
+
+    # Drivers are imported lazily so an embedded deployment does not need
+    # the MySQL client installed, and vice versa
+    if name == "mysql":
+        from config.backends.mysql_backend import MySQLBackend
+        return MySQLBackend(**options)
+
+    if name == "sqlite":
+        from config.backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(**options)
+
+    raise ValueError(f"Unknown DB_BACKEND '{name}'. Expected 'mysql' or 'sqlite'.")
+
+
+def create_replica_backend(name=None):
+    """Build the read replica for DB_BACKEND, or None when none is configured.
+
+    MySQL replicas are configured with DB_REPLICA_HOST (plus optional
+    DB_REPLICA_PORT, DB_REPLICA_USER, DB_REPLICA_PASSWORD and
+    DB_REPLICA_POOL_SIZE). For SQLite, SQLITE_REPLICA_PATH opens a second,
+    read-only set of connections, usually to the same WAL-mode file.
+    """
+    name = (name or os.getenv("DB_BACKEND", "mysql")).strip().lower()
+
+    if name == "mysql":
+        from config.backends.mysql_backend import MySQLBackend, replica_config_from_env
+        config = replica_config_from_env()
+        if config is None:
+            return None
+        return MySQLBackend(
+            pool_name="bus_booking_replica_pool",
+            pool_size=int(os.getenv("DB_REPLICA_POOL_SIZE", "5")),
+            **config
+        )
+
+    if name == "sqlite":
+        path = os.getenv("SQLITE_REPLICA_PATH")
+        if not path:
+            return None
+        from config.backends.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(path, read_only=True)
+
+    raise ValueError(f"Unknown DB_BACKEND '{name}'. Expected 'mysql' or 'sqlite'.")
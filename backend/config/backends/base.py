@@ -0,0 +1,21 @@
+class DatabaseBackend:
+    """Storage backend behind the model classes.
+
+    Models only ever see the object returned by get_connection(): a
+    DB-API style connection whose cursor(dictionary=True) yields dict rows
+    and accepts %s placeholders. Each backend is responsible for making its
+    driver look like that.
+    """
+
+    name = None
+
+    def get_connection(self):
+        raise NotImplementedError
+
+    def close(self):
+        """Release every connection held by the backend"""
+
+    def replication_lag(self):
+        """Seconds this backend trails its primary: 0 when it is not a
+        replica, None when replication is stopped or broken"""
+        return 0.0
@@ -0,0 +1,92 @@
+import os
+import threading
+from mysql.connector import pooling
+
+from config.backends.base import DatabaseBackend
+
+
+def config_from_env():
+    db_password = os.getenv("DB_PASSWORD")
+
+    if db_password is None:
+        raise RuntimeError(
+            "DB_PASSWORD is not set. Please define it in your environment or .env file."
+        )
+
+    return {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "port": int(os.getenv("DB_PORT", "3306")),
+        "user": os.getenv("DB_USER", "root"),
+        "password": db_password,
+        "database": os.getenv("DB_NAME", "busticketapp")
+    }
+
+
+def replica_config_from_env():
+    """Connection settings for the read replica, or None when DB_REPLICA_HOST is unset"""
+    host = os.getenv("DB_REPLICA_HOST")
+    if not host:
+        return None
+
+    config = config_from_env()
+    config.update({
+        "host": host,
+        "port": int(os.getenv("DB_REPLICA_PORT", "3306")),
+        "user": os.getenv("DB_REPLICA_USER", config["user"]),
+        "password": os.getenv("DB_REPLICA_PASSWORD", config["password"]),
+    })
+    return config
+
+
+class MySQLBackend(DatabaseBackend):
+    name = "mysql"
+
+    def __init__(self, pool_name="bus_booking_pool", pool_size=5, **db_config):
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self.db_config = db_config or None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        # The pool is only built on first use so that importing the models
+        # never needs a reachable server or credentials
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = pooling.MySQLConnectionPool(
+                        pool_name=self.pool_name,
+                        pool_size=self.pool_size,
+                        pool_reset_session=True,
+                        **(self.db_config or config_from_env())
+                    )
+        return self._pool
+
+    def get_connection(self):
+        return self._get_pool().get_connection()
+
+    def close(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool._remove_connections()
+
+    def replication_lag(self):
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Exception:
+                # Servers before 8.0.22 only know the old spelling
+                cursor.execute("SHOW SLAVE STATUS")
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        if not rows:
+            return 0.0
+        status = rows[0]
+        lag = status.get("Seconds_Behind_Source", status.get("Seconds_Behind_Master"))
+        return float(lag) if lag is not None else None
@@ -0,0 +1,170 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from functools import lru_cache
+
+from config.backends.base import DatabaseBackend
+
+DEFAULT_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "busticketapp.db"
+)
+
+_AUTO_INCREMENT = re.compile(r"\b(?:BIG)?INT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE)
+_INSERT_IGNORE = re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE)
+_ON_DUPLICATE = re.compile(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", re.IGNORECASE)
+_VALUES_REF = re.compile(r"\bVALUES\((\w+)\)", re.IGNORECASE)
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\b", re.IGNORECASE)
+
+
+def _convert_date(value):
+    try:
+        return date.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+
+def _convert_timestamp(value):
+    try:
+        return datetime.fromisoformat(value.decode())
+    except ValueError:
+        return value.decode()
+
+
+# Return DATE / TIMESTAMP columns as the same Python types mysql.connector does
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", _convert_date)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("DATETIME", _convert_timestamp)
+
+
+@lru_cache(maxsize=512)
+def translate(sql):
+    """Rewrite the MySQL flavoured SQL used by the models into SQLite syntax"""
+    sql = _AUTO_INCREMENT.sub("INTEGER PRIMARY KEY AUTOINCREMENT", sql)
+    sql = _INSERT_IGNORE.sub("INSERT OR IGNORE", sql)
+    # A single writer holds the whole database, so row locks are implied
+    sql = _FOR_UPDATE.sub("", sql)
+    upsert = _ON_DUPLICATE.search(sql)
+    if upsert:
+        # SQLite >= 3.35 accepts an upsert without a conflict target
+        updates = _VALUES_REF.sub(r"excluded.\1", sql[upsert.end():])
+        sql = sql[:upsert.start()] + "ON CONFLICT DO UPDATE SET" + updates
+    return sql.replace("%s", "?")
+
+
+class SQLiteCursor:
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate(sql), params or ())
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate(sql), seq_of_params)
+
+    def _to_row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip([col[0] for col in self._cursor.description], row))
+
+    def fetchone(self):
+        return self._to_row(self._cursor.fetchone())
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if not self._dictionary:
+            return rows
+        columns = [col[0] for col in self._cursor.description]
+        return [dict(zip(columns, row)) for row in rows]
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """Per-thread connection handle.
+
+    close() behaves like returning a pooled MySQL connection: pending work
+    is rolled back and the underlying connection stays open for reuse.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self._raw.cursor(), dictionary=dictionary)
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if self._raw.in_transaction:
+            self._raw.rollback()
+
+
+class SQLiteBackend(DatabaseBackend):
+    name = "sqlite"
+
+    def __init__(self, path=None, timeout=5.0, cached_statements=256, read_only=False):
+        self.path = path or os.getenv("SQLITE_PATH") or DEFAULT_PATH
+        self.read_only = read_only
+        self.timeout = timeout
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        raw = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            cached_statements=self.cached_statements,
+            check_same_thread=False
+        )
+        raw.execute("PRAGMA journal_mode=WAL")
+        raw.execute("PRAGMA synchronous=NORMAL")
+        raw.execute("PRAGMA foreign_keys=ON")
+        if self.read_only:
+            # WAL readers never block the writer; query_only guarantees a
+            # misrouted write fails instead of landing here
+            raw.execute("PRAGMA query_only=ON")
+        with self._lock:
+            self._connections.append(raw)
+        return raw
+
+    def get_connection(self):
+        # One long-lived connection per thread: statements stay compiled in
+        # the connection's statement cache and reads never wait on a pool
+        raw = getattr(self._local, "raw", None)
+        if raw is None:
+            raw = self._connect()
+            self._local.raw = raw
+        return SQLiteConnection(raw)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for raw in connections:
+            raw.close()
+        self._local = threading.local()
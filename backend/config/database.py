@@ -1,34 +1,205 @@
-import mysql.connector
-from mysql.connector import pooling
+import contextvars
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
+from config.backends import create_backend, create_replica_backend
+from monitoring.instrumentation import InstrumentedConnection
+from monitoring.metrics import db_pool_wait_seconds, db_reads_total, registry
+
 load_dotenv()
 
-db_password = os.getenv("DB_PASSWORD")
+logger = logging.getLogger("database")
 
-if db_password is None:
-    raise RuntimeError(
-        "DB_PASSWORD is not set. Please define it in your environment or .env file."
-    )
+_backend = None
+_backend_lock = threading.Lock()
+
+# Reads go to the replica only while its lag is known to be under
+# REPLICA_MAX_LAG; the lag is re-checked at most every REPLICA_CHECK_INTERVAL
+REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+
+_UNSET = object()
+_replica = _UNSET
+_replica_lag = None
+_replica_checked_at = None
+_replica_check_lock = threading.Lock()
+
+_force_primary = contextvars.ContextVar("force_primary", default=False)
+
+def get_backend():
+    """Return the active storage backend, creating it from DB_BACKEND on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(os.getenv("DB_BACKEND", "mysql"))
+    return _backend
+
+def set_backend(backend):
+    """Swap the active storage backend, closing the previous one and its replica"""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    if previous is not None and previous is not backend:
+        previous.close()
+        set_replica(_UNSET)
+
+def get_replica():
+    """Return the read replica backend, or None when none is configured"""
+    global _replica
+    if _replica is _UNSET:
+        with _backend_lock:
+            if _replica is _UNSET:
+                _replica = create_replica_backend(os.getenv("DB_BACKEND", "mysql"))
+    return _replica
+
+def set_replica(backend):
+    """Swap the read replica; None routes every read to the primary"""
+    global _replica, _replica_lag, _replica_checked_at
+    with _backend_lock:
+        previous, _replica = _replica, backend
+        _replica_lag, _replica_checked_at = None, None
+    if previous not in (None, _UNSET) and previous is not backend:
+        previous.close()
+
+@contextmanager
+def use_primary():
+    """Send every read in this block to the primary, for read-your-writes paths"""
+    token = _force_primary.set(True)
+    try:
+        yield
+    finally:
+        _force_primary.reset(token)
+
+def _replica_usable(replica):
+    global _replica_lag, _replica_checked_at
+    now = time.monotonic()
+    # One reader refreshes the lag while the others use the last known value
+    if (_replica_checked_at is None or now - _replica_checked_at >= REPLICA_CHECK_INTERVAL) \
+            and _replica_check_lock.acquire(blocking=False):
+        try:
+            try:
+                lag = replica.replication_lag()
+            except Exception as e:
+                logger.warning("Replica lag check failed, reading from primary: %s", e)
+                lag = None
+            if lag is not None and lag > REPLICA_MAX_LAG:
+                logger.warning("Replica is %.1fs behind, reading from primary", lag)
+            _replica_lag, _replica_checked_at = lag, now
+        finally:
+            _replica_check_lock.release()
+    lag = _replica_lag
+    return lag is not None and lag <= REPLICA_MAX_LAG
+
+def get_db_connection(readonly=False):
+    """Check out a connection; readonly=True lets it come from the replica.
+
+    Only pass readonly for reads that tolerate REPLICA_MAX_LAG seconds of
+    staleness. Writes, and reads of a row the caller just wrote, use the
+    primary.
+    """
+    global _replica_lag
+    if readonly and not _force_primary.get():
+        replica = get_replica()
+        if replica is not None and _replica_usable(replica):
+            start = time.perf_counter()
+            try:
+                conn = replica.get_connection()
+            except Exception as e:
+                logger.warning("Replica unavailable, reading from primary: %s", e)
+                _replica_lag = None
+            else:
+                db_pool_wait_seconds.observe((f"{replica.name}_replica",), time.perf_counter() - start)
+                db_reads_total.inc(("replica",))
+                return InstrumentedConnection(conn)
+        db_reads_total.inc(("primary",))
+
+    backend = get_backend()
+    start = time.perf_counter()
+    conn = backend.get_connection()
+    db_pool_wait_seconds.observe((backend.name,), time.perf_counter() - start)
+    return InstrumentedConnection(conn)
+
+def _collect_replica_lag():
+    if _replica in (None, _UNSET) or _replica_checked_at is None:
+        return []
+    return [
+        "# HELP db_replica_lag_seconds Last measured replica lag; -1 when replication is broken.",
+        "# TYPE db_replica_lag_seconds gauge",
+        f"db_replica_lag_seconds {_replica_lag if _replica_lag is not None else -1}",
+    ]
+
+registry.add_collector(_collect_replica_lag)
+
+# Bump whenever init_database() changes so running deployments re-apply it once
+SCHEMA_VERSION = 9
+
+def get_schema_version():
+    """Return the schema version recorded in the database, or 0 if none"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT MAX(version) FROM schema_version")
+            row = cursor.fetchone()
+        except Exception:
+            # schema_version does not exist yet
+            return 0
+        finally:
+            cursor.close()
+        return row[0] or 0
+    finally:
+        conn.close()
 
-db_config = {
-    "host": os.getenv("DB_HOST", "localhost"),
-    "port": int(os.getenv("DB_PORT", "3306")),
-    "user": os.getenv("DB_USER", "root"),
-    "password": db_password,
-    "database": os.getenv("DB_NAME", "busticketapp")
-}
+def ensure_schema():
+    """Run init_database() unless the current schema version is already applied.
 
-connection_pool = pooling.MySQLConnectionPool(
-    pool_name="bus_booking_pool",
-    pool_size=5,
-    pool_reset_session=True,
-    **db_config
-)
+    Costs a single query when the schema is up to date, so it is safe to call
+    from every worker on every start.
+    """
+    if get_schema_version() >= SCHEMA_VERSION:
+        return False
+    init_database()
+    return True
 
-def get_db_connection():
-    return connection_pool.get_connection()
+def _create_index(cursor, name, table, columns):
+    try:
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+    except Exception as e:
+        # MySQL has no CREATE INDEX IF NOT EXISTS
+        if "already exists" not in str(e) and "Duplicate key name" not in str(e):
+            raise
+
+BOOKING_CHANGES_TABLE = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        seq BIGINT AUTO_INCREMENT PRIMARY KEY,
+        event_type VARCHAR(20) NOT NULL,
+        booking_reference VARCHAR(20) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at DATETIME NOT NULL
+    )
+"""
+
+def _migrate_booking_changes(cursor):
+    """Move booking_changes from the single-row counter to AUTO_INCREMENT, keeping its cursors"""
+    try:
+        cursor.execute("SELECT seq FROM booking_change_sequence")
+        cursor.fetchall()
+    except Exception:
+        # Never had the counter, or already migrated
+        return
+    cursor.execute(BOOKING_CHANGES_TABLE.format(table="booking_changes_migrated"))
+    cursor.execute("""
+        INSERT INTO booking_changes_migrated (seq, event_type, booking_reference, payload, created_at)
+        SELECT seq, event_type, booking_reference, payload, created_at FROM booking_changes
+    """)
+    cursor.execute("DROP TABLE booking_changes")
+    cursor.execute("ALTER TABLE booking_changes_migrated RENAME TO booking_changes")
+    cursor.execute("DROP TABLE booking_change_sequence")
 
 def init_database():
     """Initialize database schema"""
@@ -93,6 +264,32 @@ def init_database():
         )
     """)
 
+    _create_index(cursor, "idx_bookings_phone", "bookings", "customer_phone, created_at")
+    # Counts a trip's bookings when its seat inventory row is first created
+    _create_index(cursor, "idx_bookings_trip", "bookings", "bus_provider, from_district, to_district, travel_date")
+
+    # Bookings for trips past the archive horizon, moved by archive_bookings.py.
+    # id is the original bookings.id, so re-running an interrupted move is safe
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bookings_archive (
+            id INT NOT NULL PRIMARY KEY,
+            booking_reference VARCHAR(20) NOT NULL,
+            customer_name VARCHAR(100) NOT NULL,
+            customer_phone VARCHAR(20) NOT NULL,
+            from_district VARCHAR(100) NOT NULL,
+            to_district VARCHAR(100) NOT NULL,
+            dropping_point VARCHAR(100) NOT NULL,
+            bus_provider VARCHAR(100) NOT NULL,
+            travel_date DATE NOT NULL,
+            fare INT NOT NULL,
+            status VARCHAR(20),
+            created_at TIMESTAMP NULL,
+            archived_at DATETIME NOT NULL
+        )
+    """)
+
+    _create_index(cursor, "idx_bookings_archive_phone", "bookings_archive", "customer_phone, created_at")
+
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS bus_documents (
             id INT AUTO_INCREMENT PRIMARY KEY,
@@ -102,6 +299,83 @@ def init_database():
         )
     """)
 
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS trip_inventory (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            bus_provider VARCHAR(100) NOT NULL,
+            from_district VARCHAR(100) NOT NULL,
+            to_district VARCHAR(100) NOT NULL,
+            travel_date DATE NOT NULL,
+            capacity INT NOT NULL,
+            reserved INT NOT NULL DEFAULT 0,
+            UNIQUE (bus_provider, from_district, to_district, travel_date)
+        )
+    """)
+
+    # The unique key doubles as the (trip_id, expires_at) index used to
+    # reclaim and count expired holds for a single trip
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS seat_holds (
+            hold_id VARCHAR(32) NOT NULL PRIMARY KEY,
+            trip_id INT NOT NULL,
+            expires_at DATETIME NOT NULL,
+            UNIQUE (trip_id, expires_at, hold_id),
+            FOREIGN KEY (trip_id) REFERENCES trip_inventory(id)
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            idem_key VARCHAR(100) NOT NULL PRIMARY KEY,
+            request_hash CHAR(64) NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            status_code INT,
+            response TEXT,
+            expires_at DATETIME NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (expires_at, idem_key)
+        )
+    """)
+
+    # The second unique key serves date-range dashboard queries
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS booking_daily_stats (
+            bus_provider VARCHAR(100) NOT NULL,
+            from_district VARCHAR(100) NOT NULL,
+            to_district VARCHAR(100) NOT NULL,
+            travel_date DATE NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            booking_count INT NOT NULL DEFAULT 0,
+            fare_total BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (bus_provider, from_district, to_district, travel_date, status),
+            UNIQUE (travel_date, bus_provider, from_district, to_district, status)
+        )
+    """)
+
+    # Outbox for downstream consumers, written in the booking transaction
+    _migrate_booking_changes(cursor)
+    cursor.execute(BOOKING_CHANGES_TABLE.format(table="booking_changes"))
+
+    # Single row bumped by every catalog write; workers poll it to know when
+    # their in-memory snapshots are stale
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_version (
+            id INT NOT NULL PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0
+        )
+    """)
+
+    cursor.execute("INSERT IGNORE INTO catalog_version (id, version) VALUES (1, 0)")
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT NOT NULL PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    cursor.execute("INSERT IGNORE INTO schema_version (version) VALUES (%s)", (SCHEMA_VERSION,))
+
     conn.commit()
     cursor.close()
     conn.close()
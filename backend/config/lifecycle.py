@@ -0,0 +1,73 @@
+import logging
+import threading
+from contextlib import asynccontextmanager
+
+from config.database import ensure_schema, set_backend
+
+logger = logging.getLogger("startup")
+
+_warmups = []
+_shutdown_hooks = []
+
+class StartupState:
+    def __init__(self):
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self.completed = []
+        self.error = None
+
+    def reset(self):
+        """Start over: the app may be started again in the same process (tests, reloads)"""
+        self.ready.clear()
+        self.stopping.clear()
+        self.completed = []
+        self.error = None
+
+    def pending(self):
+        return [name for name, _ in _warmups if name not in self.completed]
+
+state = StartupState()
+
+def register_warmup(name, fn):
+    """Run fn() in the background at startup; /readyz waits for it"""
+    _warmups.append((name, fn))
+
+def register_shutdown(fn):
+    """Run fn() when the application shuts down, before the backend is closed"""
+    _shutdown_hooks.append(fn)
+
+def _startup(retry_delay=1.0, max_delay=30.0):
+    # Keep retrying instead of giving up: the process stays live (/healthz)
+    # but is only routed traffic (/readyz) once the DB and caches are usable
+    delay = retry_delay
+    while not state.stopping.is_set():
+        try:
+            if ensure_schema():
+                logger.info("Database schema applied")
+            for name, fn in _warmups:
+                if name not in state.completed:
+                    fn()
+                    state.completed.append(name)
+            state.error = None
+            state.ready.set()
+            logger.info("Startup complete")
+            return
+        except Exception as e:
+            state.error = f"{type(e).__name__}: {e}"
+            logger.error("Startup failed, retrying in %.0fs: %s", delay, state.error)
+            state.stopping.wait(delay)
+            delay = min(delay * 2, max_delay)
+
+@asynccontextmanager
+async def lifespan(app):
+    # A previous lifespan in this process left stopping set
+    state.reset()
+    thread = threading.Thread(target=_startup, name="startup", daemon=True)
+    thread.start()
+    yield
+    state.stopping.set()
+    # A startup still retrying must not resume when the next lifespan clears stopping
+    thread.join(timeout=5)
+    for fn in _shutdown_hooks:
+        fn()
+    set_backend(None)
@@ -1,12 +1,15 @@
 from models.booking import Booking
+from models.booking_change import BookingChange
+from models.booking_stats import BookingStats
+from models.trip_inventory import TripInventory
 
 class BookingController:
     @staticmethod
     def create_booking(customer_name, customer_phone, from_district, to_district,
-                      dropping_point, bus_provider, travel_date, fare):
+                      dropping_point, bus_provider, travel_date, fare, hold_id=None):
         result = Booking.create(
             customer_name, customer_phone, from_district, to_district,
-            dropping_point, bus_provider, travel_date, fare
+            dropping_point, bus_provider, travel_date, fare, hold_id
         )
 
         booking = Booking.get_by_reference_and_phone(
@@ -20,8 +23,8 @@ class BookingController:
         }
 
     @staticmethod
-    def get_bookings_by_phone(phone):
-        return Booking.get_by_phone(phone)
+    def get_bookings_by_phone(phone, include_archived=False):
+        return Booking.get_by_phone(phone, include_archived)
 
     @staticmethod
     def cancel_booking(booking_reference, customer_phone):
@@ -39,3 +42,27 @@ class BookingController:
             "success": success,
             "message": "Booking cancelled successfully" if success else "Failed to cancel"
         }
+
+    @staticmethod
+    def hold_seat(bus_provider, from_district, to_district, travel_date):
+        return TripInventory.hold(bus_provider, from_district, to_district, travel_date)
+
+    @staticmethod
+    def get_availability(bus_provider, from_district, to_district, travel_date):
+        return TripInventory.get_availability(bus_provider, from_district, to_district, travel_date)
+
+    @staticmethod
+    def get_daily_stats(**filters):
+        return BookingStats.get_daily(**filters)
+
+    @staticmethod
+    def get_provider_stats(**filters):
+        return BookingStats.get_provider_totals(**filters)
+
+    @staticmethod
+    def get_changes(after, limit, wait):
+        changes = BookingChange.wait(after, limit, wait)
+        return {
+            "changes": changes,
+            "next_cursor": changes[-1]['cursor'] if changes else after
+        }
@@ -1,36 +1,88 @@
 from models.district import District
 from models.dropping_point import DroppingPoint
 from models.bus_provider import BusProvider
+from models.bootstrap import BootstrapPayload
+from models.name_index import NameIndex, canonical_name
+from models.route_graph import RouteGraph
 
 class BusController:
     @staticmethod
     def search_buses(from_district, to_district, max_price=None):
-        from_providers = BusProvider.get_providers_serving_district(from_district)
-        to_providers = BusProvider.get_providers_serving_district(to_district)
+        return BusController.search_buses_batch([(from_district, to_district, max_price)])[0]
 
-        from_names = {p['name'] for p in from_providers}
-        to_names = {p['name'] for p in to_providers}
-        available_providers = from_names & to_names
+    @staticmethod
+    def search_buses_batch(searches):
+        """Answer several (from_district, to_district, max_price) searches at once.
+
+        Provider coverage and dropping points are fetched once for the union
+        of districts, so a batch costs two queries however many searches it
+        holds. Results come back in input order.
+        """
+        return list(BusController.iter_search_results(searches))
+
+    @staticmethod
+    def iter_search_results(searches):
+        """Fetch data for all searches, then yield each search_buses() result in input order"""
+        # Typos, case and aliases ("chittagong") are resolved before any query runs
+        searches = [
+            (canonical_name(from_district, "district"), canonical_name(to_district, "district"), max_price)
+            for from_district, to_district, max_price in searches
+        ]
+        districts = sorted({name for search in searches for name in search[:2]})
+        destinations = sorted({search[1] for search in searches})
+
+        providers_by_district = {}
+        provider_rows = {}
+        for row in BusProvider.get_providers_serving_districts(districts):
+            provider = dict(row)
+            district_name = provider.pop('district_name')
+            providers_by_district.setdefault(district_name, set()).add(provider['name'])
+            provider_rows[provider['name']] = provider
+
+        points_by_district = {}
+        for dp in DroppingPoint.get_by_district_names(destinations):
+            points_by_district.setdefault(dp['district_name'], []).append(dp)
+
+        def build(from_district, to_district, max_price):
+            from_names = providers_by_district.get(from_district, set())
+            to_names = providers_by_district.get(to_district, set())
+            available_providers = sorted(from_names & to_names)
 
-        dropping_points = DroppingPoint.get_by_district_name(to_district)
+            dropping_points = points_by_district.get(to_district, [])
 
-        if max_price:
-            dropping_points = [dp for dp in dropping_points if dp['price'] <= max_price]
+            if max_price:
+                dropping_points = [dp for dp in dropping_points if dp['price'] <= max_price]
 
-        results = []
-        for provider_name in available_providers:
-            provider = BusProvider.get_by_name(provider_name)
-            for dp in dropping_points:
-                results.append({
-                    "provider": provider_name,
-                    "provider_details": provider,
-                    "from_district": from_district,
-                    "to_district": to_district,
-                    "dropping_point": dp['name'],
-                    "fare": dp['price']
-                })
+            results = []
+            for provider_name in available_providers:
+                provider = provider_rows[provider_name]
+                for dp in dropping_points:
+                    results.append({
+                        "provider": provider_name,
+                        "provider_details": provider,
+                        "from_district": from_district,
+                        "to_district": to_district,
+                        "dropping_point": dp['name'],
+                        "fare": dp['price']
+                    })
+            return results
 
-        return results
+        # Queries run eagerly above; only building each result is deferred
+        return (build(*search) for search in searches)
+
+    @staticmethod
+    def search_connections(from_district, to_district, max_legs=2, limit=5, max_price=None):
+        """Cheapest itineraries, including ones that change provider on the way"""
+        return RouteGraph.current().cheapest_itineraries(from_district, to_district, max_legs, limit, max_price)
+
+    @staticmethod
+    def autocomplete(query, limit=10, kind=None):
+        return NameIndex.current().complete(query, limit, kind)
+
+    @staticmethod
+    def get_bootstrap():
+        """Pre-encoded districts, dropping points, providers and coverage"""
+        return BootstrapPayload.current()
 
     @staticmethod
     def get_all_districts():
@@ -43,9 +95,9 @@ class BusController:
     @staticmethod
     def get_provider_details(provider_name):
         """Get detailed information about a specific provider"""
-        return BusProvider.get_provider_details(provider_name)
+        return BusProvider.get_provider_details(canonical_name(provider_name, "provider"))
 
     @staticmethod
     def get_providers_by_district(district_name):
         """Get all providers serving a specific district"""
-        return BusProvider.get_providers_serving_district(district_name)
+        return BusProvider.get_providers_serving_district(canonical_name(district_name, "district"))
@@ -1,11 +1,16 @@
 from models.bus_document import BusDocument
-from models.district import District
-from models.bus_provider import BusProvider
-from models.provider_route import ProviderRoute
-from models.dropping_point import DroppingPoint
+from models.catalog import Catalog
+from models.chat_session import ChatSessions
+from monitoring.metrics import chat_document_lookups_total, llm_request_duration_seconds, llm_tokens_total
 from groq import Groq
 import os
 import json
+import re
+import time
+
+LLM_MODEL = "llama-3.3-70b-versatile"
+
+FARE_LIMIT = re.compile(r"(?:under|below|less than|within|up to|upto|max(?:imum)?|cheaper than)\s*(?:৳|tk\.?|taka)?\s*(\d+)")
 
 class ChatController:
     def __init__(self):
@@ -15,85 +20,68 @@ class ChatController:
         else:
             self.groq_client = Groq(api_key=api_key)
 
-    def process_query(self, user_query):
+    def chat(self, message, session_id=None):
+        """Answer message within a server-side session, creating one if needed"""
+        session = ChatSessions.get_or_create(session_id)
+        with session.lock:
+            response = self.process_query(message, session)
+        return {"response": response, "session_id": session.id}
+
+    def process_query(self, user_query, session=None):
         if not self.groq_client:
             return self._fallback_response(user_query)
 
         try:
-            # Get all providers to check against query
-            providers = BusProvider.get_all()
-            
-            relevant_docs = []
-            # Check if any provider name is mentioned in the query
-            for provider in providers:
-                if provider['name'].lower() in user_query.lower():
-                    # Fetch specific document for this provider
-                    # We can use search with just the provider name to get their doc
-                    docs = BusDocument.search(provider['name'], limit=1)
-                    relevant_docs.extend(docs)
-            
-            # If no specific provider mentioned, or to add more context, do a general search
-            if not relevant_docs:
-                search_term = user_query
-                query_lower = user_query.lower()
-                
-                if "cancel" in query_lower or "refund" in query_lower:
-                    search_term = "Cancellation Policy"
-                elif "contact" in query_lower or "phone" in query_lower or "email" in query_lower:
-                    search_term = "Contact Information"
-                elif "address" in query_lower:
-                    search_term = "Official Address"
-                    
-                relevant_docs = BusDocument.search(search_term, limit=3)
-                
-            # Deduplicate docs based on id or content
-            seen_content = set()
-            unique_docs = []
-            for doc in relevant_docs:
-                if doc['content'] not in seen_content:
-                    unique_docs.append(doc)
-                    seen_content.add(doc['content'])
-            
-            context = "\n\n".join([doc["content"] for doc in unique_docs])
+            catalog = Catalog.get()
 
-            districts = District.get_all()
-            providers = BusProvider.get_all()
-            routes = ProviderRoute.get_all()
+            districts, providers, max_fare = self._extract_entities(user_query, catalog)
+            if session is not None:
+                # Follow-ups ("what about under 600?") keep the earlier route and providers
+                session.remember(districts, providers, max_fare)
+                districts, providers = session.districts, session.providers
 
-            # Build routes summary with provider coverage
-            routes_summary = {}
-            for route in routes:
-                provider = route['provider_name']
-                district = route['district_name']
-                if provider not in routes_summary:
-                    routes_summary[provider] = []
-                routes_summary[provider].append(district)
+            unique_docs = self._retrieve(user_query, providers, session)
+            context = "\n\n".join([doc["content"] for doc in unique_docs])
+
+            # Once a route is known, only its districts and providers go into the prompt
+            if len(districts) >= 2:
+                route_providers = {name for d in districts for name in catalog.district_providers.get(d, [])}
+                route_providers.update(providers)
+                prompt_districts = districts
+                routes_summary = {name: catalog.coverage[name] for name in sorted(route_providers) if name in catalog.coverage}
+            else:
+                prompt_districts = [d['name'] for d in catalog.districts]
+                # Provider coverage and fares come from the in-memory catalog
+                routes_summary = catalog.coverage
 
-            # Get all dropping points with prices for each district
             district_fares = {}
-            for district in districts:
-                dropping_points = DroppingPoint.get_by_district_name(district['name'])
-                district_fares[district['name']] = [
+            for district in prompt_districts:
+                district_fares[district] = [
                     {
                         'dropping_point': dp['name'],
                         'price': dp['price']
                     }
-                    for dp in dropping_points
+                    for dp in catalog.dropping_points.get(district, [])
                 ]
 
+            conversation = session.summary() if session is not None else ""
+            conversation_context = f"""
+CONVERSATION SO FAR: the user has asked about {conversation}. Interpret follow-up questions in that context.
+""" if conversation else ""
+
             system_context = f"""You are a helpful bus booking assistant. Use the following information to answer questions:
 
-AVAILABLE DISTRICTS: {json.dumps([d['name'] for d in districts])}
+AVAILABLE DISTRICTS: {json.dumps(prompt_districts)}
 
 BUS PROVIDERS AND THEIR ROUTES:
-{json.dumps(routes_summary, indent=2)}
+{json.dumps(routes_summary, separators=(',', ':'))}
 
 FARES BY DISTRICT (Dropping Points and Prices in Taka):
-{json.dumps(district_fares, indent=2)}
+{json.dumps(district_fares, separators=(',', ':'))}
 
 PROVIDER DETAILS:
 {context}
-
+{conversation_context}
 IMPORTANT INSTRUCTIONS:
 - When asked about fares/prices, check the FARES BY DISTRICT section
 - To find buses from District A to District B under X taka:
@@ -107,19 +95,103 @@ IMPORTANT INSTRUCTIONS:
 
 Answer the user's question accurately based on this data."""
 
+            messages = [{"role": "system", "content": system_context}]
+            if session is not None:
+                messages += session.history()
+            messages.append({"role": "user", "content": user_query})
+
+            response = self._complete(messages)
+            answer = response.choices[0].message.content
+            if session is not None:
+                session.add_turn(user_query, answer)
+            return answer
+        except Exception as e:
+            return f"I encountered an error processing your request: {str(e)}"
+
+    def _extract_entities(self, user_query, catalog):
+        """Districts and providers named in the query, in order, and any fare limit"""
+        query_lower = user_query.lower()
+
+        def mentioned(names):
+            found = [(query_lower.find(name.lower()), name) for name in names]
+            return [name for position, name in sorted(found) if position >= 0]
+
+        districts = mentioned(d['name'] for d in catalog.districts)
+        providers = mentioned(p['name'] for p in catalog.providers)
+
+        max_fare = None
+        match = FARE_LIMIT.search(query_lower)
+        if match:
+            max_fare = int(match.group(1))
+        return districts, providers, max_fare
+
+    def _retrieve(self, user_query, providers, session):
+        """Provider documents for the query, reusing what the session already fetched"""
+        query_lower = user_query.lower()
+        search_term = None
+        if "cancel" in query_lower or "refund" in query_lower:
+            search_term = "Cancellation Policy"
+        elif "contact" in query_lower or "phone" in query_lower or "email" in query_lower:
+            search_term = "Contact Information"
+        elif "address" in query_lower:
+            search_term = "Official Address"
+
+        def lookup(key, term, limit):
+            docs = session.cached_docs(key) if session is not None else None
+            if docs is None:
+                chat_document_lookups_total.inc(("search",))
+                docs = BusDocument.search(term, limit=limit)
+                if session is not None:
+                    session.store_docs(key, docs)
+            else:
+                chat_document_lookups_total.inc(("session",))
+            return docs
+
+        relevant_docs = []
+        # Fetch the specific document for each provider mentioned so far
+        for provider in providers:
+            relevant_docs.extend(lookup(f"provider:{provider}", provider, 1))
+
+        # If no specific provider mentioned, or to add more context, do a general search
+        if not relevant_docs:
+            if search_term:
+                relevant_docs = lookup(f"search:{search_term}", search_term, 3)
+            elif session is not None and session.recent_docs() is not None:
+                # A follow-up without a new topic keeps the documents already in play
+                chat_document_lookups_total.inc(("session",))
+                relevant_docs = session.recent_docs()
+            else:
+                relevant_docs = lookup(f"search:{query_lower.strip()}", user_query, 3)
+
+        # Deduplicate docs based on id or content
+        seen_content = set()
+        unique_docs = []
+        for doc in relevant_docs:
+            if doc['content'] not in seen_content:
+                unique_docs.append(doc)
+                seen_content.add(doc['content'])
+        return unique_docs
+
+    def _complete(self, messages):
+        """Call the LLM, recording latency and token usage"""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
             response = self.groq_client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": system_context},
-                    {"role": "user", "content": user_query}
-                ],
+                model=LLM_MODEL,
+                messages=messages,
                 temperature=0.7,
                 max_tokens=1000
             )
+            outcome = "ok"
+        finally:
+            llm_request_duration_seconds.observe((LLM_MODEL, outcome), time.perf_counter() - start)
 
-            return response.choices[0].message.content
-        except Exception as e:
-            return f"I encountered an error processing your request: {str(e)}"
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            llm_tokens_total.inc((LLM_MODEL, "prompt"), usage.prompt_tokens or 0)
+            llm_tokens_total.inc((LLM_MODEL, "completion"), usage.completion_tokens or 0)
+        return response
 
     def _fallback_response(self, query):
         query_lower = query.lower()
@@ -136,18 +208,12 @@ Answer the user's question accurately based on this data."""
             return response
 
         elif "district" in query_lower or "route" in query_lower or "serve" in query_lower:
-            routes = ProviderRoute.get_all()
-            routes_summary = {}
-            for route in routes:
-                provider = route['provider_name']
-                district = route['district_name']
-                if provider not in routes_summary:
-                    routes_summary[provider] = []
-                routes_summary[provider].append(district)
+            routes_summary = Catalog.get().coverage
 
             response = "Here are the available routes:\n\n"
             for provider, districts in routes_summary.items():
-                response += f"{provider}: {', '.join(districts)}\n"
+                if districts:
+                    response += f"{provider}: {', '.join(districts)}\n"
             return response
 
         else:
@@ -1,38 +1,67 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import json
 import os
 from dotenv import load_dotenv
 
-from config.database import init_database
+from config.lifecycle import lifespan, register_shutdown, register_warmup, state as startup_state
 from controllers.bus_controller import BusController
 from controllers.booking_controller import BookingController
 from controllers.chat_controller import ChatController
+from models.booking_change import BookingChange
+from models.catalog import CatalogWatcher
+from models.idempotency import Idempotency, IdempotencyConflict, IdempotencyInProgress
+from models.route_graph import MAX_LEGS
+from models.trip_inventory import SoldOutError
+from middleware.admission import AdmissionControlMiddleware
+from monitoring.metrics import registry
+from monitoring.middleware import MetricsMiddleware
+from monitoring.profiler import QueryProfilerMiddleware
 
 load_dotenv()
 
-app = FastAPI(title="Bus Booking System")
+app = FastAPI(title="Bus Booking System", lifespan=lifespan)
 
+# Starlette runs the last added middleware first: metrics see every
+# response, CORS headers are added to rejections, then admission control
+app.add_middleware(QueryProfilerMiddleware)
+if os.getenv("ADMISSION_CONTROL", "on").lower() not in ("0", "off", "false"):
+    app.add_middleware(AdmissionControlMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Queries", "X-DB-Time-ms", "Retry-After", "Idempotent-Replayed", "ETag"],
 )
+app.add_middleware(MetricsMiddleware)
 
-try:
-    init_database()
-    print("Database initialized successfully")
-except Exception as e:
-    print(f"Database initialization error: {e}")
+catalog_watcher = CatalogWatcher()
+register_warmup("catalog", catalog_watcher.start)
+register_shutdown(catalog_watcher.stop)
+register_warmup("change-feed", BookingChange.open)
+register_shutdown(BookingChange.close)
 
 class SearchBusRequest(BaseModel):
     from_district: str
     to_district: str
     max_price: Optional[int] = None
 
+class BatchSearchBusRequest(BaseModel):
+    searches: List[SearchBusRequest] = Field(max_length=100)
+
+class SearchConnectionsRequest(BaseModel):
+    from_district: str
+    to_district: str
+    max_legs: int = Field(default=2, ge=1, le=MAX_LEGS)
+    limit: int = Field(default=5, ge=1, le=20)
+    max_price: Optional[int] = None
+
 class BookingRequest(BaseModel):
     customer_name: str
     customer_phone: str
@@ -42,6 +71,13 @@ class BookingRequest(BaseModel):
     bus_provider: str
     travel_date: str
     fare: int
+    hold_id: Optional[str] = None
+
+class SeatHoldRequest(BaseModel):
+    bus_provider: str
+    from_district: str
+    to_district: str
+    travel_date: str
 
 class CancelBookingRequest(BaseModel):
     booking_reference: str
@@ -49,6 +85,7 @@ class CancelBookingRequest(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
 
 bus_controller = BusController()
 booking_controller = BookingController()
@@ -58,6 +95,23 @@ chat_controller = ChatController()
 def read_root():
     return {"message": "Bus Booking System API with MVC Architecture"}
 
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz():
+    if startup_state.ready.is_set():
+        return {"status": "ready"}
+    return JSONResponse(
+        status_code=503,
+        content={
+            "status": "starting",
+            "pending": startup_state.pending(),
+            "error": startup_state.error
+        }
+    )
+
 @app.post("/search-buses")
 def search_buses(request: SearchBusRequest):
     try:
@@ -70,8 +124,37 @@ def search_buses(request: SearchBusRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/book-ticket")
-def book_ticket(request: BookingRequest):
+@app.post("/search-buses/batch")
+def search_buses_batch(request: BatchSearchBusRequest, stream: bool = False):
+    """Each entry matches the /search-buses response for the same search, in input order"""
+    try:
+        searches = [(s.from_district, s.to_district, s.max_price) for s in request.searches]
+        if not stream:
+            results = bus_controller.search_buses_batch(searches)
+            return {"searches": [{"results": r} for r in results]}
+
+        results = bus_controller.iter_search_results(searches)
+        lines = (json.dumps(jsonable_encoder({"results": r})) + "\n" for r in results)
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/search-connections")
+def search_connections(request: SearchConnectionsRequest):
+    try:
+        itineraries = bus_controller.search_connections(
+            request.from_district,
+            request.to_district,
+            request.max_legs,
+            request.limit,
+            request.max_price
+        )
+        return {"itineraries": itineraries}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _book_ticket(request: BookingRequest):
+    """Create the booking, returning (status_code, body) so the result can be stored for replay"""
     try:
         result = booking_controller.create_booking(
             request.customer_name,
@@ -81,16 +164,98 @@ def book_ticket(request: BookingRequest):
             request.dropping_point,
             request.bus_provider,
             request.travel_date,
-            request.fare
+            request.fare,
+            request.hold_id
         )
-        return result
+        return 200, jsonable_encoder(result)
+    except SoldOutError as e:
+        return 409, {"detail": str(e)}
+    except Exception as e:
+        return 500, {"detail": str(e)}
+
+@app.post("/book-ticket")
+def book_ticket(
+    request: BookingRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, max_length=64)
+):
+    if idempotency_key:
+        try:
+            status_code, body, replayed = Idempotency.run(
+                f"book-ticket:{idempotency_key}",
+                request.model_dump(),
+                lambda: _book_ticket(request)
+            )
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except IdempotencyInProgress as e:
+            raise HTTPException(status_code=409, detail=str(e), headers={"Retry-After": "1"})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+    else:
+        status_code, body = _book_ticket(request)
+
+    if status_code != 200:
+        raise HTTPException(status_code=status_code, detail=body["detail"])
+    return body
+
+@app.post("/holds")
+def hold_seat(request: SeatHoldRequest):
+    try:
+        return booking_controller.hold_seat(
+            request.bus_provider,
+            request.from_district,
+            request.to_district,
+            request.travel_date
+        )
+    except SoldOutError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/availability")
+def get_availability(bus_provider: str, from_district: str, to_district: str, travel_date: str):
+    try:
+        return booking_controller.get_availability(bus_provider, from_district, to_district, travel_date)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/daily")
+def get_daily_analytics(bus_provider: Optional[str] = None, from_district: Optional[str] = None,
+                        to_district: Optional[str] = None, date_from: Optional[str] = None,
+                        date_to: Optional[str] = None):
+    try:
+        stats = booking_controller.get_daily_stats(
+            bus_provider=bus_provider, from_district=from_district, to_district=to_district,
+            date_from=date_from, date_to=date_to
+        )
+        return {"stats": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/providers")
+def get_provider_analytics(date_from: Optional[str] = None, date_to: Optional[str] = None):
+    try:
+        stats = booking_controller.get_provider_stats(date_from=date_from, date_to=date_to)
+        return {"providers": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/bookings/changes")
+def get_booking_changes(after: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=500),
+                        wait: float = Query(0, ge=0, le=30)):
+    """Booking events after a cursor; with wait, blocks until one arrives or the wait runs out"""
+    try:
+        return booking_controller.get_changes(after, limit, wait)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/my-bookings/{phone}")
-def get_bookings(phone: str):
+def get_bookings(phone: str, include_archived: bool = False):
     try:
-        bookings = booking_controller.get_bookings_by_phone(phone)
+        bookings = booking_controller.get_bookings_by_phone(phone, include_archived)
         return {"bookings": bookings}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -108,6 +273,48 @@ def cancel_booking(request: CancelBookingRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/autocomplete")
+def autocomplete(
+    q: str,
+    limit: int = Query(default=10, ge=1, le=50),
+    kind: Optional[str] = Query(default=None, pattern="^(district|provider|dropping_point)$")
+):
+    try:
+        suggestions = bus_controller.autocomplete(q, limit, kind)
+        return {"suggestions": suggestions}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _accepts_gzip(accept_encoding):
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+@app.get("/bootstrap")
+def get_bootstrap(if_none_match: Optional[str] = Header(None),
+                  accept_encoding: Optional[str] = Header(None)):
+    """Districts, dropping points, providers and coverage in one cacheable response"""
+    try:
+        payload = bus_controller.get_bootstrap()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    gzipped = _accepts_gzip(accept_encoding)
+    # Clients may cache it, but revalidate so a catalog change shows up at once
+    headers = {
+        "ETag": payload.gzip_etag if gzipped else payload.etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding"
+    }
+    if payload.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+        return Response(payload.gzipped, media_type="application/json", headers=headers)
+    return Response(payload.body, media_type="application/json", headers=headers)
+
 @app.get("/districts")
 def get_districts():
     try:
@@ -147,10 +354,19 @@ def get_providers_by_district(district_name: str):
 @app.post("/chat")
 def chat(request: ChatRequest):
     try:
-        response = chat_controller.process_query(request.message)
-        return {"response": response}
+        return chat_controller.chat(request.message, request.session_id)
     except Exception as e:
-        return {"response": f"I'm having trouble processing your question. Error: {str(e)}"}
+        return {
+            "response": f"I'm having trouble processing your question. Error: {str(e)}",
+            "session_id": request.session_id
+        }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(
+        registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
 
 if __name__ == "__main__":
     import uvicorn
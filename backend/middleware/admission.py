@@ -0,0 +1,240 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+
+import anyio.to_thread
+from starlette.responses import JSONResponse
+
+from monitoring.metrics import registry
+
+# Paths that must keep answering under load
+EXEMPT_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+WRITE_PATHS = {"/book-ticket", "/cancel-booking", "/holds"}
+CHAT_PATHS = {"/chat"}
+# Long-polls hold a worker thread for their whole wait
+FEED_PATHS = {"/bookings/changes"}
+
+# class: (tokens per second, burst, concurrent requests, queue length, max queue wait seconds)
+DEFAULT_LIMITS = {
+    "chat": (1.0, 5, 4, 8, 2.0),
+    "write": (5.0, 20, 16, 32, 1.0),
+    "read": (50.0, 100, 32, 64, 0.5),
+    "feed": (2.0, 10, 8, 0, 0.0),
+}
+
+# Worker threads beyond the class pools, for the exempt endpoints
+EXEMPT_THREADS = 8
+
+# Per-client buckets are kept in an LRU so memory stays bounded
+MAX_TRACKED_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+
+def _env(name, default, cast):
+    value = os.getenv(name)
+    return cast(value) if value not in (None, "") else default
+
+def _trusted_proxies(value):
+    """RATE_LIMIT_TRUST_PROXY: true for one proxy, or the number of proxies"""
+    value = value.strip().lower()
+    if value in ("true", "yes"):
+        return 1
+    return int(value) if value.isdigit() else 0
+
+def load_limits():
+    """Defaults, overridable per class, e.g. RATE_LIMIT_CHAT_RATE / CONCURRENCY_CHAT_LIMIT"""
+    limits = {}
+    for name, (rate, burst, concurrency, queue, wait) in DEFAULT_LIMITS.items():
+        prefix = name.upper()
+        limits[name] = {
+            "rate": _env(f"RATE_LIMIT_{prefix}_RATE", rate, float),
+            "burst": _env(f"RATE_LIMIT_{prefix}_BURST", burst, float),
+            "concurrency": _env(f"CONCURRENCY_{prefix}_LIMIT", concurrency, int),
+            "queue": _env(f"CONCURRENCY_{prefix}_QUEUE", queue, int),
+            "wait": _env(f"CONCURRENCY_{prefix}_WAIT", wait, float),
+        }
+    return limits
+
+def classify(method, path):
+    if path in CHAT_PATHS:
+        return "chat"
+    if path in FEED_PATHS:
+        return "feed"
+    if method != "GET" and path in WRITE_PATHS:
+        return "write"
+    return "read"
+
+
+class RateLimiter:
+    """Token buckets per (client, endpoint class).
+
+    Only touched from the event loop, so no locking is needed.
+    """
+
+    def __init__(self, rate, burst, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    def take(self, client, now=None):
+        """Spend one token; returns 0 when allowed, else seconds until one is available"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self._buckets[client] = bucket
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        return (1 - bucket[0]) / self.rate
+
+
+class ConcurrencyPool:
+    """Caps in-flight requests for one endpoint class, with a bounded wait queue"""
+
+    def __init__(self, limit, queue_size, max_wait):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    async def acquire(self):
+        """Returns None once admitted, or the rejection reason"""
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                return "queue_full"
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                return "queue_timeout"
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+        self.active += 1
+        return None
+
+    def release(self):
+        self.active -= 1
+        self._semaphore.release()
+
+
+class AdmissionControlMiddleware:
+    """Sheds load early instead of letting latency grow without bound.
+
+    Each request is classed as chat, write, feed or read. A per-client token
+    bucket answers 429 when a client exceeds its rate, and a per-class
+    concurrency pool answers 503 when its wait queue is full or the wait
+    runs out, both with Retry-After. Slow /chat calls can therefore never
+    take every worker thread away from searches and bookings.
+    """
+
+    def __init__(self, app, limits=None, trust_forwarded_for=None):
+        self.app = app
+        self.limits = limits or load_limits()
+        if trust_forwarded_for is None:
+            trust_forwarded_for = _trusted_proxies(os.getenv("RATE_LIMIT_TRUST_PROXY", ""))
+        # Number of proxies in front of the app that append to X-Forwarded-For
+        self.trust_forwarded_for = int(trust_forwarded_for)
+        self.limiters = {
+            name: RateLimiter(config["rate"], config["burst"]) for name, config in self.limits.items()
+        }
+        self.pools = {
+            name: ConcurrencyPool(config["concurrency"], config["queue"], config["wait"])
+            for name, config in self.limits.items()
+        }
+        self.rejected = {}
+        registry.add_collector(self.collect)
+
+    def _client(self, scope):
+        if self.trust_forwarded_for:
+            # Proxies append the address they saw, so only the entries our own
+            # proxies added can be trusted; anything left of them is client input
+            forwarded = [
+                entry.strip()
+                for name, value in scope.get("headers", []) if name == b"x-forwarded-for"
+                for entry in value.decode("latin-1").split(",") if entry.strip()
+            ]
+            if forwarded:
+                return forwarded[max(len(forwarded) - self.trust_forwarded_for, 0)]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def _reject(self, scope, receive, send, endpoint_class, reason, status, retry_after):
+        key = (endpoint_class, reason)
+        self.rejected[key] = self.rejected.get(key, 0) + 1
+        response = JSONResponse(
+            {"detail": "Too many requests" if status == 429 else "Server busy, please retry"},
+            status_code=status,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
+
+    def thread_budget(self):
+        return sum(config["concurrency"] for config in self.limits.values()) + EXEMPT_THREADS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            # Sync endpoints share anyio's worker threads (40 by default). Size
+            # them so every class can run its full pool at once; otherwise a
+            # burst in one class takes the threads admitted requests of the
+            # other classes are waiting for
+            limiter = anyio.to_thread.current_default_thread_limiter()
+            limiter.total_tokens = max(limiter.total_tokens, self.thread_budget())
+            await self.app(scope, receive, send)
+            return
+
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        endpoint_class = classify(scope["method"], scope["path"])
+
+        wait = self.limiters[endpoint_class].take(self._client(scope))
+        if wait:
+            await self._reject(scope, receive, send, endpoint_class, "rate_limited", 429, wait)
+            return
+
+        pool = self.pools[endpoint_class]
+        reason = await pool.acquire()
+        if reason:
+            await self._reject(scope, receive, send, endpoint_class, reason, 503, pool.max_wait)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            pool.release()
+
+    def collect(self):
+        lines = [
+            "# HELP admission_active_requests Requests currently admitted, by endpoint class.",
+            "# TYPE admission_active_requests gauge",
+        ]
+        lines += [f'admission_active_requests{{pool="{name}"}} {pool.active}' for name, pool in self.pools.items()]
+        lines += [
+            "# HELP admission_queued_requests Requests waiting for a slot, by endpoint class.",
+            "# TYPE admission_queued_requests gauge",
+        ]
+        lines += [f'admission_queued_requests{{pool="{name}"}} {pool.waiting}' for name, pool in self.pools.items()]
+        lines += [
+            "# HELP admission_rejected_total Requests shed, by endpoint class and reason.",
+            "# TYPE admission_rejected_total counter",
+        ]
+        lines += [
+            f'admission_rejected_total{{pool="{name}",reason="{reason}"}} {count}'
+            for (name, reason), count in sorted(self.rejected.items())
+        ]
+        return lines
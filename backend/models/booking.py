@@ -1,4 +1,10 @@
 from config.database import get_db_connection
+from models.booking_archive import BookingArchive
+from models.booking_change import BookingChange
+from models.booking_stats import BookingStats
+from models.idempotency import Idempotency
+from models.trip_inventory import TripInventory
+from datetime import datetime
 import random
 import string
 
@@ -9,11 +15,15 @@ class Booking:
 
     @staticmethod
     def create(customer_name, customer_phone, from_district, to_district,
-               dropping_point, bus_provider, travel_date, fare):
+               dropping_point, bus_provider, travel_date, fare, hold_id=None):
         booking_ref = Booking.generate_reference()
         conn = get_db_connection()
         try:
             cursor = conn.cursor()
+            # The seat and the booking row commit together, or not at all
+            if not TripInventory.claim_hold(cursor, hold_id, bus_provider, from_district,
+                                            to_district, travel_date):
+                TripInventory.reserve(cursor, bus_provider, from_district, to_district, travel_date)
             cursor.execute("""
                 INSERT INTO bookings
                 (booking_reference, customer_name, customer_phone, from_district,
@@ -21,28 +31,58 @@ class Booking:
                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, 'confirmed')
             """, (booking_ref, customer_name, customer_phone, from_district,
                   to_district, dropping_point, bus_provider, travel_date, fare))
-            conn.commit()
             booking_id = cursor.lastrowid
+            BookingStats.record(cursor, bus_provider, from_district, to_district,
+                                travel_date, 'confirmed', 1, fare)
+            Idempotency.mark_committed(cursor)
+            BookingChange.record(cursor, 'created', {
+                "booking_reference": booking_ref, "customer_name": customer_name,
+                "customer_phone": customer_phone, "from_district": from_district,
+                "to_district": to_district, "dropping_point": dropping_point,
+                "bus_provider": bus_provider, "travel_date": travel_date, "fare": fare,
+                "status": 'confirmed'
+            })
+            conn.commit()
             cursor.close()
+            BookingChange.notify()
             return {"id": booking_id, "booking_reference": booking_ref}
         finally:
             conn.close()
 
     @staticmethod
-    def get_by_phone(phone):
-        conn = get_db_connection()
+    def get_by_phone(phone, include_archived=False):
+        """Bookings for trips within the archive horizon, newest first.
+
+        The travel_date bound lets MySQL prune bookings partitions the
+        archive job has not dropped yet. With include_archived, trips past the
+        horizon are wanted anyway: the live table is read in full, so trips
+        not archived yet are not missed, and the archive is merged in.
+        """
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
-            cursor.execute(
-                "SELECT * FROM bookings WHERE customer_phone = %s ORDER BY created_at DESC",
-                (phone,)
-            )
+            if include_archived:
+                cursor.execute(
+                    "SELECT * FROM bookings WHERE customer_phone = %s ORDER BY created_at DESC",
+                    (phone,)
+                )
+            else:
+                cursor.execute(
+                    "SELECT * FROM bookings WHERE customer_phone = %s AND travel_date >= %s ORDER BY created_at DESC",
+                    (phone, BookingArchive.cutoff())
+                )
             results = cursor.fetchall()
             cursor.close()
-            return results
         finally:
             conn.close()
 
+        if include_archived:
+            # Archived rows have older travel dates, but may have been booked
+            # after some live ones, so the merged list is sorted again
+            results += BookingArchive.get_by_phone(phone)
+            results.sort(key=lambda booking: booking['created_at'] or datetime.min, reverse=True)
+        return results
+
     @staticmethod
     def get_by_reference_and_phone(booking_reference, phone):
         conn = get_db_connection()
@@ -63,13 +103,39 @@ class Booking:
         conn = get_db_connection()
         try:
             cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE bookings SET status = 'cancelled' WHERE booking_reference = %s AND customer_phone = %s",
-                (booking_reference, phone)
-            )
+            # References are unique per travel date once bookings is
+            # partitioned, so pick this customer's row and update it by key
+            cursor.execute("""
+                SELECT id, customer_name, dropping_point, bus_provider, from_district, to_district, travel_date, fare
+                FROM bookings
+                WHERE booking_reference = %s AND customer_phone = %s AND status != 'cancelled'
+                ORDER BY travel_date DESC LIMIT 1
+            """, (booking_reference, phone))
+            rows = cursor.fetchall()
+            affected = 0
+            if rows:
+                booking_id, customer_name, dropping_point, bus_provider, from_district, to_district, travel_date, fare = rows[0]
+                cursor.execute(
+                    "UPDATE bookings SET status = 'cancelled' WHERE id = %s AND travel_date = %s AND status != 'cancelled'",
+                    (booking_id, travel_date)
+                )
+                affected = cursor.rowcount
+            if affected > 0:
+                trip = (bus_provider, from_district, to_district, travel_date)
+                TripInventory.release(cursor, *trip)
+                BookingStats.record(cursor, *trip, 'confirmed', -1, fare)
+                BookingStats.record(cursor, *trip, 'cancelled', 1, fare)
+                BookingChange.record(cursor, 'cancelled', {
+                    "booking_reference": booking_reference, "customer_name": customer_name,
+                    "customer_phone": phone, "from_district": from_district,
+                    "to_district": to_district, "dropping_point": dropping_point,
+                    "bus_provider": bus_provider, "travel_date": travel_date, "fare": fare,
+                    "status": 'cancelled'
+                })
             conn.commit()
-            affected = cursor.rowcount
             cursor.close()
+            if affected > 0:
+                BookingChange.notify()
             return affected > 0
         finally:
             conn.close()
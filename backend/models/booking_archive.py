@@ -0,0 +1,180 @@
+from config.database import get_backend, get_db_connection
+from datetime import date, datetime, timedelta, timezone
+import logging
+import os
+import re
+
+# Trips this many days in the past are moved out of the hot bookings table
+ARCHIVE_AFTER_DAYS = int(os.getenv("BOOKING_ARCHIVE_AFTER_DAYS", "90"))
+# Monthly partitions kept ready ahead of the current month (MySQL only)
+PARTITION_MONTHS_AHEAD = int(os.getenv("BOOKING_PARTITION_MONTHS_AHEAD", "3"))
+
+BOOKING_COLUMNS = ("id, booking_reference, customer_name, customer_phone, from_district, to_district, "
+                   "dropping_point, bus_provider, travel_date, fare, status, created_at")
+
+_PARTITION_NAME = re.compile(r"^p(\d{4})(\d{2})$")
+
+logger = logging.getLogger("archive")
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _month_start(day):
+    return day.replace(day=1)
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def _partition(month):
+    """Partition holding travel dates in the month starting at month"""
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_next_month(month):%Y-%m-%d}')"
+
+class BookingArchive:
+    """Moves completed trips out of bookings and keeps its partitions in shape.
+
+    On MySQL, bookings is range-partitioned by month of travel_date, so live
+    queries and index maintenance only touch recent partitions, and
+    archived months are dropped as whole partitions instead of leaving
+    deleted rows behind. SQLite keeps a single table. There the archive
+    move is what keeps the hot table small.
+    """
+
+    @staticmethod
+    def cutoff(days=None):
+        return _now().date() - timedelta(days=ARCHIVE_AFTER_DAYS if days is None else days)
+
+    @staticmethod
+    def archive(before, batch_size=1000):
+        """Move bookings with travel_date < before into bookings_archive; returns rows moved.
+
+        Rows move in short batches, each copied and deleted in one
+        transaction, so live bookings are never blocked for long.
+        """
+        moved = 0
+        while True:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT id FROM bookings WHERE travel_date < %s ORDER BY id LIMIT %s",
+                    (before, batch_size)
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    cursor.close()
+                    break
+                placeholders = ", ".join(["%s"] * len(ids))
+                cursor.execute(f"""
+                    INSERT IGNORE INTO bookings_archive ({BOOKING_COLUMNS}, archived_at)
+                    SELECT {BOOKING_COLUMNS}, %s FROM bookings WHERE id IN ({placeholders})
+                """, (_now(), *ids))
+                cursor.execute(f"DELETE FROM bookings WHERE id IN ({placeholders})", tuple(ids))
+                conn.commit()
+                cursor.close()
+                moved += len(ids)
+            finally:
+                conn.close()
+        return moved
+
+    @staticmethod
+    def get_by_phone(phone):
+        conn = get_db_connection(readonly=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(
+                f"SELECT {BOOKING_COLUMNS} FROM bookings_archive WHERE customer_phone = %s ORDER BY created_at DESC",
+                (phone,)
+            )
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        finally:
+            conn.close()
+
+    @staticmethod
+    def partitioned():
+        return get_backend().name == "mysql"
+
+    @staticmethod
+    def _partitions(cursor):
+        cursor.execute("""
+            SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'bookings' AND PARTITION_NAME IS NOT NULL
+            ORDER BY PARTITION_ORDINAL_POSITION
+        """)
+        return [row[0] for row in cursor.fetchall()]
+
+    @staticmethod
+    def ensure_partitions(months_ahead=None):
+        """Partition bookings by month (converting it on first run) and add
+        partitions for the coming months. Returns the partitions created."""
+        if not BookingArchive.partitioned():
+            return []
+        months_ahead = PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+        last = _month_start(_now().date())
+        for _ in range(months_ahead):
+            last = _next_month(last)
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            existing = BookingArchive._partitions(cursor)
+            if not existing:
+                cursor.execute("SELECT MIN(travel_date) FROM bookings")
+                oldest = cursor.fetchall()[0][0]
+                first_new = _month_start(min(oldest, _now().date()) if oldest else _now().date())
+                # Every unique key of a partitioned table must include the
+                # partitioning column, so booking_reference becomes unique per
+                # travel date
+                cursor.execute("""
+                    ALTER TABLE bookings
+                        DROP PRIMARY KEY, ADD PRIMARY KEY (id, travel_date),
+                        DROP INDEX booking_reference,
+                        ADD UNIQUE KEY booking_reference (booking_reference, travel_date)
+                """)
+                statement = "ALTER TABLE bookings PARTITION BY RANGE COLUMNS(travel_date) ({})"
+            else:
+                months = [_PARTITION_NAME.match(name) for name in existing]
+                newest = max((date(int(m.group(1)), int(m.group(2)), 1) for m in months if m), default=None)
+                first_new = _next_month(newest) if newest else _month_start(_now().date())
+                statement = "ALTER TABLE bookings REORGANIZE PARTITION pmax INTO ({})"
+
+            partitions = []
+            month = first_new
+            while month <= last:
+                partitions.append(_partition(month))
+                month = _next_month(month)
+            if not partitions and existing:
+                cursor.close()
+                return []
+            partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+            cursor.execute(statement.format(", ".join(partitions)))
+            cursor.close()
+            return [p.split()[1] for p in partitions[:-1]]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def drop_archived_partitions(before):
+        """Drop monthly partitions that end on or before the archive cutoff and are empty"""
+        if not BookingArchive.partitioned():
+            return []
+        before = date.fromisoformat(str(before))
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            dropped = []
+            for name in BookingArchive._partitions(cursor):
+                match = _PARTITION_NAME.match(name)
+                if not match or _next_month(date(int(match.group(1)), int(match.group(2)), 1)) > before:
+                    continue
+                cursor.execute(f"SELECT COUNT(*) FROM bookings PARTITION ({name})")
+                if cursor.fetchall()[0][0]:
+                    logger.warning("Partition %s still has rows, keeping it", name)
+                    continue
+                cursor.execute(f"ALTER TABLE bookings DROP PARTITION {name}")
+                dropped.append(name)
+            cursor.close()
+            return dropped
+        finally:
+            conn.close()
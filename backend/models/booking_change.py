@@ -0,0 +1,116 @@
+from config.database import get_db_connection
+from datetime import datetime, timedelta, timezone
+import json
+import os
+import threading
+import time
+
+# How often a long-poll re-reads the table, to see changes committed by other workers
+POLL_INTERVAL = float(os.getenv("BOOKING_CHANGES_POLL_INTERVAL", "1.0"))
+# How long a missing cursor may still be committing before readers skip it
+GAP_TIMEOUT = float(os.getenv("BOOKING_CHANGES_GAP_TIMEOUT", "10"))
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class BookingChange:
+    """Transactional outbox of booking events, read by cursor.
+
+    Cursors are AUTO_INCREMENT ids, so concurrent booking transactions do
+    not wait on each other for a number. Ids are handed out before commit,
+    though, so a lower id can become visible after a higher one. Readers
+    therefore stop at the first missing id (the safe high-water mark) until
+    it shows up or is GAP_TIMEOUT old, which means its transaction rolled
+    back. A consumer that has read up to N never misses a later commit.
+    """
+
+    _changed = threading.Condition()
+    _generation = 0
+    _closed = False
+
+    @staticmethod
+    def record(cursor, event_type, booking):
+        """Append an event inside the caller's transaction; returns its cursor.
+
+        Call it as the last statement before commit, so readers waiting on
+        its id are held up for as short a time as possible.
+        """
+        cursor.execute("""
+            INSERT INTO booking_changes (event_type, booking_reference, payload, created_at)
+            VALUES (%s, %s, %s, %s)
+        """, (event_type, booking['booking_reference'], json.dumps(booking, default=str), _now()))
+        return cursor.lastrowid
+
+    @staticmethod
+    def notify():
+        """Wake local long-polls after a change has been committed"""
+        with BookingChange._changed:
+            BookingChange._generation += 1
+            BookingChange._changed.notify_all()
+
+    @staticmethod
+    def open():
+        """Accept long-polls again after close(), when the app is started again"""
+        with BookingChange._changed:
+            BookingChange._closed = False
+
+    @staticmethod
+    def close():
+        """Release every waiting long-poll, e.g. at shutdown"""
+        with BookingChange._changed:
+            BookingChange._closed = True
+            BookingChange._changed.notify_all()
+
+    @staticmethod
+    def read(after=0, limit=100):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT seq, event_type, booking_reference, payload, created_at
+                FROM booking_changes
+                WHERE seq > %s
+                ORDER BY seq
+                LIMIT %s
+            """, (after, limit))
+            rows = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+
+        # Stop before a missing id that may still commit; one older than
+        # GAP_TIMEOUT (judged by the row after it) was rolled back
+        settled = _now() - timedelta(seconds=GAP_TIMEOUT)
+        expected = after + 1
+        for count, row in enumerate(rows):
+            if row['seq'] != expected and row['created_at'] > settled:
+                rows = rows[:count]
+                break
+            expected = row['seq'] + 1
+
+        return [
+            {
+                "cursor": row['seq'],
+                "event": row['event_type'],
+                "booking_reference": row['booking_reference'],
+                "booking": json.loads(row['payload']),
+                "created_at": row['created_at'],
+            }
+            for row in rows
+        ]
+
+    @staticmethod
+    def wait(after=0, limit=100, timeout=0):
+        """Like read(), but block up to timeout seconds while there is nothing new"""
+        deadline = time.monotonic() + timeout
+        while True:
+            # A commit between the read and the wait bumps the generation,
+            # so it is re-read instead of being slept through
+            generation = BookingChange._generation
+            changes = BookingChange.read(after, limit)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0 or BookingChange._closed:
+                return changes
+            with BookingChange._changed:
+                if BookingChange._generation == generation and not BookingChange._closed:
+                    BookingChange._changed.wait(min(remaining, POLL_INTERVAL))
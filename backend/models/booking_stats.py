@@ -0,0 +1,118 @@
+from config.database import get_db_connection
+
+class BookingStats:
+    """Bookings and fares per (provider, from, to, travel_date, status).
+
+    Maintained in the same transaction as every booking write, so dashboards
+    read a handful of pre-aggregated rows instead of scanning bookings.
+    """
+
+    @staticmethod
+    def record(cursor, bus_provider, from_district, to_district, travel_date, status, count, fare):
+        """Add count bookings worth fare (both may be negative) inside the caller's transaction"""
+        cursor.execute("""
+            INSERT INTO booking_daily_stats
+            (bus_provider, from_district, to_district, travel_date, status, booking_count, fare_total)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                booking_count = booking_count + VALUES(booking_count),
+                fare_total = fare_total + VALUES(fare_total)
+        """, (bus_provider, from_district, to_district, travel_date, status, count, count * fare))
+
+    @staticmethod
+    def rebuild(date_from=None, date_to=None):
+        """Recompute the rollup from bookings and their archive, optionally for a travel_date range"""
+        where = []
+        params = []
+        if date_from:
+            where.append("travel_date >= %s")
+            params.append(date_from)
+        if date_to:
+            where.append("travel_date <= %s")
+            params.append(date_to)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM booking_daily_stats {where_sql}", tuple(params))
+            cursor.execute(f"""
+                INSERT INTO booking_daily_stats
+                (bus_provider, from_district, to_district, travel_date, status, booking_count, fare_total)
+                SELECT bus_provider, from_district, to_district, travel_date, status, COUNT(*), SUM(fare)
+                FROM (
+                    SELECT bus_provider, from_district, to_district, travel_date, status, fare FROM bookings
+                    UNION ALL
+                    SELECT bus_provider, from_district, to_district, travel_date, status, fare FROM bookings_archive
+                ) all_bookings
+                {where_sql}
+                GROUP BY bus_provider, from_district, to_district, travel_date, status
+            """, tuple(params))
+            rows = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            return rows
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _filters(bus_provider=None, from_district=None, to_district=None, date_from=None, date_to=None):
+        where = []
+        params = []
+        for column, value in (("bus_provider", bus_provider), ("from_district", from_district),
+                              ("to_district", to_district)):
+            if value:
+                where.append(f"{column} = %s")
+                params.append(value)
+        if date_from:
+            where.append("travel_date >= %s")
+            params.append(date_from)
+        if date_to:
+            where.append("travel_date <= %s")
+            params.append(date_to)
+        return (f"WHERE {' AND '.join(where)}" if where else ""), tuple(params)
+
+    @staticmethod
+    def get_daily(**filters):
+        """One row per provider, route and travel date"""
+        where_sql, params = BookingStats._filters(**filters)
+        conn = get_db_connection(readonly=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT bus_provider, from_district, to_district, travel_date,
+                       SUM(CASE WHEN status = 'confirmed' THEN booking_count ELSE 0 END) as confirmed_bookings,
+                       SUM(CASE WHEN status = 'cancelled' THEN booking_count ELSE 0 END) as cancelled_bookings,
+                       SUM(CASE WHEN status = 'confirmed' THEN fare_total ELSE 0 END) as revenue
+                FROM booking_daily_stats
+                {where_sql}
+                GROUP BY bus_provider, from_district, to_district, travel_date
+                ORDER BY travel_date, bus_provider, from_district, to_district
+            """, params)
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_provider_totals(**filters):
+        where_sql, params = BookingStats._filters(**filters)
+        conn = get_db_connection(readonly=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT bus_provider,
+                       SUM(CASE WHEN status = 'confirmed' THEN booking_count ELSE 0 END) as confirmed_bookings,
+                       SUM(CASE WHEN status = 'cancelled' THEN booking_count ELSE 0 END) as cancelled_bookings,
+                       SUM(CASE WHEN status = 'confirmed' THEN fare_total ELSE 0 END) as revenue
+                FROM booking_daily_stats
+                {where_sql}
+                GROUP BY bus_provider
+                ORDER BY bus_provider
+            """, params)
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        finally:
+            conn.close()
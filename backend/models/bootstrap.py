@@ -0,0 +1,47 @@
+import gzip
+import hashlib
+import json
+
+from models.catalog import Catalog, CatalogSnapshot
+
+class BootstrapPayload:
+    """Everything the frontend needs before its first search, encoded once.
+
+    The JSON body and its gzip form are built from a catalog snapshot the
+    first time they are asked for and reused until the snapshot is
+    replaced, so serving /bootstrap is a dictionary lookup plus a write.
+    """
+
+    def __init__(self, snapshot):
+        self.version = snapshot.version
+        payload = {
+            "version": snapshot.version,
+            "districts": snapshot.districts,
+            "dropping_points": snapshot.dropping_points,
+            "providers": snapshot.providers,
+            "coverage": snapshot.coverage,
+        }
+        self.body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        # mtime=0 keeps the compressed bytes identical across workers
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        # Hash the content rather than trusting the version alone: a rebuilt
+        # database starts counting versions from zero again
+        tag = f"{snapshot.version}-{hashlib.sha1(self.body).hexdigest()[:16]}"
+        # Strong ETags name exact bytes, so each encoding gets its own
+        self.etag = f'"{tag}"'
+        self.gzip_etag = f'"{tag}-gz"'
+
+    @staticmethod
+    def current():
+        """Payload for the active catalog snapshot"""
+        return Catalog.get().index("bootstrap")
+
+    def matches(self, if_none_match):
+        """True when an If-None-Match header already names this payload, in either encoding"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or self.gzip_etag in tags
+
+
+CatalogSnapshot.register_index("bootstrap", BootstrapPayload)
@@ -1,4 +1,5 @@
 from config.database import get_db_connection
+from models.catalog_version import CatalogVersion
 
 class BusDocument:
     @staticmethod
@@ -10,16 +11,18 @@ class BusDocument:
                 "INSERT INTO bus_documents (provider_name, content) VALUES (%s, %s)",
                 (provider_name, content)
             )
-            conn.commit()
             doc_id = cursor.lastrowid
+            CatalogVersion.bump(cursor)
+            conn.commit()
             cursor.close()
+            CatalogVersion.notify()
             return doc_id
         finally:
             conn.close()
 
     @staticmethod
     def get_all():
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM bus_documents")
@@ -31,7 +34,7 @@ class BusDocument:
 
     @staticmethod
     def search(query, limit=3):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute(
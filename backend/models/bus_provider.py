@@ -1,11 +1,12 @@
 from config.database import get_db_connection
+from models.catalog_version import CatalogVersion
 import os
 import re
 
 class BusProvider:
     @staticmethod
     def get_all():
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM bus_providers ORDER BY name")
@@ -17,7 +18,7 @@ class BusProvider:
 
     @staticmethod
     def get_by_name(name):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM bus_providers WHERE name = %s", (name,))
@@ -36,16 +37,18 @@ class BusProvider:
                 "INSERT INTO bus_providers (name, contact_info, address, privacy_policy) VALUES (%s, %s, %s, %s)",
                 (name, contact_info, address, privacy_policy)
             )
-            conn.commit()
             provider_id = cursor.lastrowid
+            CatalogVersion.bump(cursor)
+            conn.commit()
             cursor.close()
+            CatalogVersion.notify()
             return provider_id
         finally:
             conn.close()
 
     @staticmethod
     def get_providers_serving_district(district_name):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
@@ -61,6 +64,28 @@ class BusProvider:
         finally:
             conn.close()
 
+    @staticmethod
+    def get_providers_serving_districts(district_names):
+        """Providers for several districts in one query, tagged with district_name"""
+        if not district_names:
+            return []
+        conn = get_db_connection(readonly=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            placeholders = ", ".join(["%s"] * len(district_names))
+            cursor.execute(f"""
+                SELECT DISTINCT d.name as district_name, bp.*
+                FROM bus_providers bp
+                JOIN provider_routes pr ON bp.id = pr.provider_id
+                JOIN districts d ON pr.district_id = d.id
+                WHERE d.name IN ({placeholders})
+            """, tuple(district_names))
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        finally:
+            conn.close()
+
     @staticmethod
     def get_provider_details(provider_name):
         """Get detailed provider information including data from text files"""
@@ -101,7 +126,7 @@ class BusProvider:
                 privacy_policy = content.strip()
         
         # Get coverage districts
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
@@ -133,7 +158,7 @@ class BusProvider:
     @staticmethod
     def get_provider_routes(provider_name):
         """Get all routes served by a provider"""
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+
+from config.database import use_primary
+from models.catalog_version import CatalogVersion
+from models.district import District
+from models.dropping_point import DroppingPoint
+from models.bus_provider import BusProvider
+from models.provider_route import ProviderRoute
+
+class CatalogSnapshot:
+    """Immutable in-memory copy of the route catalog.
+
+    Holds districts, dropping points, providers (without policy text) and
+    provider coverage. Structures derived from the catalog (search graphs,
+    autocomplete indexes, encoded payloads) are registered with
+    register_index() and built at most once per snapshot, so they are
+    swapped together with it.
+    """
+
+    _index_builders = {}
+
+    def __init__(self, districts, dropping_points, providers, routes, version=None):
+        self.version = version
+        self.districts = [{'id': d['id'], 'name': d['name']} for d in districts]
+
+        self.dropping_points = {d['name']: [] for d in self.districts}
+        for dp in dropping_points:
+            self.dropping_points.setdefault(dp['district_name'], []).append({
+                'id': dp['id'],
+                'name': dp['name'],
+                'price': dp['price']
+            })
+
+        self.providers = [
+            {
+                'id': p['id'],
+                'name': p['name'],
+                'contact_info': p['contact_info'],
+                'address': p['address']
+            }
+            for p in providers
+        ]
+
+        self.coverage = {p['name']: [] for p in self.providers}
+        self.district_providers = {d['name']: [] for d in self.districts}
+        for route in routes:
+            self.coverage.setdefault(route['provider_name'], []).append(route['district_name'])
+            self.district_providers.setdefault(route['district_name'], []).append(route['provider_name'])
+        for names in self.coverage.values():
+            names.sort()
+        for names in self.district_providers.values():
+            names.sort()
+
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, version=None):
+        return cls(
+            District.get_all(),
+            DroppingPoint.get_all(),
+            BusProvider.get_all(),
+            ProviderRoute.get_all(),
+            version=version
+        )
+
+    @classmethod
+    def register_index(cls, name, builder):
+        """Register builder(snapshot) -> index, computed lazily per snapshot"""
+        cls._index_builders[name] = builder
+
+    def index(self, name):
+        index = self._indexes.get(name)
+        if index is None:
+            with self._lock:
+                index = self._indexes.get(name)
+                if index is None:
+                    index = self._index_builders[name](self)
+                    self._indexes[name] = index
+        return index
+
+    def warm(self):
+        """Build every registered index up front"""
+        for name in list(self._index_builders):
+            self.index(name)
+
+
+logger = logging.getLogger("catalog")
+
+class Catalog:
+    _snapshot = None
+    _lock = threading.RLock()
+
+    @staticmethod
+    def get():
+        snapshot = Catalog._snapshot
+        if snapshot is None:
+            with Catalog._lock:
+                snapshot = Catalog._snapshot or Catalog.reload()
+        return snapshot
+
+    @staticmethod
+    def reload(warm=False):
+        """Load a fresh snapshot and swap it in atomically"""
+        with Catalog._lock:
+            # Read the version before the data: a write landing mid-load
+            # leaves the snapshot looking stale, so it is reloaded again
+            version = CatalogVersion.get()
+            # Loaded from the primary: a lagging replica would produce a
+            # snapshot older than the version it is labelled with
+            with use_primary():
+                snapshot = CatalogSnapshot.load(version=version)
+            if warm:
+                snapshot.warm()
+            Catalog._snapshot = snapshot
+        return snapshot
+
+    @staticmethod
+    def refresh_if_stale():
+        """Reload when another process has bumped catalog_version; returns True if reloaded"""
+        snapshot = Catalog._snapshot
+        if snapshot is not None and CatalogVersion.get() == snapshot.version:
+            return False
+        Catalog.reload(warm=True)
+        return True
+
+
+class CatalogWatcher:
+    """Background thread keeping this worker's catalog snapshot current.
+
+    catalog_version is polled every CATALOG_POLL_INTERVAL seconds. When
+    CATALOG_SIGNAL_FILE is set, its mtime is also checked every tick so
+    writers on the same host trigger a reload without waiting for the poll.
+    """
+
+    def __init__(self, interval=None, tick=0.5):
+        self.interval = interval if interval is not None else float(os.getenv("CATALOG_POLL_INTERVAL", "5"))
+        self.tick = min(tick, self.interval)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        Catalog.reload(warm=True)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.tick * 2)
+
+    def _run(self):
+        last_poll = time.monotonic()
+        last_signal = CatalogVersion.signal_mtime()
+        while not self._stopping.wait(self.tick):
+            signal = CatalogVersion.signal_mtime()
+            now = time.monotonic()
+            if signal == last_signal and now - last_poll < self.interval:
+                continue
+            last_signal, last_poll = signal, now
+            try:
+                if Catalog.refresh_if_stale():
+                    logger.info("Catalog reloaded at version %s", Catalog.get().version)
+            except Exception as e:
+                logger.error("Catalog refresh failed: %s", e)
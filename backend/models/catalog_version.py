@@ -0,0 +1,41 @@
+from config.database import get_db_connection
+import os
+
+# Optional local file touched after every catalog write so workers on the
+# same host reload immediately instead of waiting for their next poll
+SIGNAL_FILE = os.getenv("CATALOG_SIGNAL_FILE")
+
+class CatalogVersion:
+    @staticmethod
+    def get():
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cursor.fetchone()
+            cursor.close()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    @staticmethod
+    def bump(cursor):
+        """Increment the version inside the caller's transaction"""
+        cursor.execute("UPDATE catalog_version SET version = version + 1 WHERE id = 1")
+
+    @staticmethod
+    def notify():
+        """Signal local workers after the catalog write has been committed"""
+        if not SIGNAL_FILE:
+            return
+        with open(SIGNAL_FILE, 'a'):
+            os.utime(SIGNAL_FILE, None)
+
+    @staticmethod
+    def signal_mtime():
+        if not SIGNAL_FILE:
+            return None
+        try:
+            return os.stat(SIGNAL_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return None
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+import os
+import secrets
+import threading
+import time
+
+SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "1800"))
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "10000"))
+# Per-session caps: stored turns, cached retrievals and remembered entities
+MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "20"))
+MAX_DOCS = int(os.getenv("CHAT_SESSION_MAX_DOCS", "6"))
+MAX_ENTITIES = 4
+MAX_MESSAGE_CHARS = 2000
+# Tokens of earlier turns replayed to the model on each request
+HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for English text, without a tokenizer dependency
+    return len(text) // 4 + 1
+
+def _merge(previous, mentioned):
+    """Recently mentioned names last, capped at MAX_ENTITIES"""
+    merged = [name for name in previous if name not in mentioned] + list(mentioned)
+    return merged[-MAX_ENTITIES:]
+
+class ChatSession:
+    """Compact state for one conversation.
+
+    Instead of the full transcript, a session keeps the districts,
+    providers and fare limit the user has mentioned, the documents
+    already retrieved for them, and a bounded tail of turns.
+    """
+
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = []
+        self.districts = []
+        self.providers = []
+        self.max_fare = None
+        self.docs = OrderedDict()
+        # Turns of one session run one at a time
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+    def remember(self, districts=(), providers=(), max_fare=None):
+        self.districts = _merge(self.districts, districts)
+        self.providers = _merge(self.providers, providers)
+        if max_fare is not None:
+            self.max_fare = max_fare
+
+    def cached_docs(self, key):
+        docs = self.docs.get(key)
+        if docs is not None:
+            self.docs.move_to_end(key)
+        return docs
+
+    def store_docs(self, key, docs):
+        self.docs[key] = docs
+        self.docs.move_to_end(key)
+        while len(self.docs) > MAX_DOCS:
+            self.docs.popitem(last=False)
+
+    def recent_docs(self):
+        """Documents from the latest retrieval, for follow-ups that name nothing new"""
+        return next(reversed(self.docs.values()), None) if self.docs else None
+
+    def add_turn(self, user_message, assistant_message):
+        self.turns.append((user_message[:MAX_MESSAGE_CHARS], assistant_message[:MAX_MESSAGE_CHARS]))
+        del self.turns[:-MAX_TURNS]
+
+    def history(self, budget=HISTORY_TOKEN_BUDGET):
+        """Most recent turns that fit in budget tokens, as chat messages"""
+        kept = []
+        for user_message, assistant_message in reversed(self.turns):
+            cost = estimate_tokens(user_message) + estimate_tokens(assistant_message)
+            if cost > budget:
+                break
+            budget -= cost
+            kept.append((user_message, assistant_message))
+
+        messages = []
+        for user_message, assistant_message in reversed(kept):
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": assistant_message})
+        return messages
+
+    def summary(self):
+        """One line standing in for turns trimmed from the history"""
+        parts = []
+        if self.districts:
+            parts.append(f"districts {', '.join(self.districts)}")
+        if self.providers:
+            parts.append(f"providers {', '.join(self.providers)}")
+        if self.max_fare is not None:
+            parts.append(f"fares under {self.max_fare} taka")
+        return "; ".join(parts)
+
+
+class ChatSessions:
+    """In-process LRU of chat sessions, expired after SESSION_TTL_SECONDS idle"""
+
+    _sessions = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_or_create(session_id=None):
+        now = time.monotonic()
+        with ChatSessions._lock:
+            ChatSessions._purge_expired(now)
+            session = ChatSessions._sessions.get(session_id) if session_id else None
+            if session is None:
+                session = ChatSession(secrets.token_urlsafe(16))
+                ChatSessions._sessions[session.id] = session
+                while len(ChatSessions._sessions) > MAX_SESSIONS:
+                    ChatSessions._sessions.popitem(last=False)
+            else:
+                ChatSessions._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    @staticmethod
+    def _purge_expired(now):
+        # Least recently used first, so stop at the first live session
+        sessions = ChatSessions._sessions
+        while sessions:
+            session = next(iter(sessions.values()))
+            if now - session.last_used < SESSION_TTL_SECONDS:
+                break
+            sessions.popitem(last=False)
@@ -1,9 +1,10 @@
 from config.database import get_db_connection
+from models.catalog_version import CatalogVersion
 
 class District:
     @staticmethod
     def get_all():
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM districts ORDER BY name")
@@ -15,7 +16,7 @@ class District:
 
     @staticmethod
     def get_by_name(name):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("SELECT * FROM districts WHERE name = %s", (name,))
@@ -31,9 +32,11 @@ class District:
         try:
             cursor = conn.cursor()
             cursor.execute("INSERT INTO districts (name) VALUES (%s)", (name,))
-            conn.commit()
             district_id = cursor.lastrowid
+            CatalogVersion.bump(cursor)
+            conn.commit()
             cursor.close()
+            CatalogVersion.notify()
             return district_id
         finally:
             conn.close()
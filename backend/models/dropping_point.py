@@ -1,9 +1,10 @@
 from config.database import get_db_connection
+from models.catalog_version import CatalogVersion
 
 class DroppingPoint:
     @staticmethod
     def get_by_district_id(district_id):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
@@ -20,7 +21,7 @@ class DroppingPoint:
 
     @staticmethod
     def get_by_district_name(district_name):
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
@@ -35,6 +36,44 @@ class DroppingPoint:
         finally:
             conn.close()
 
+    @staticmethod
+    def get_by_district_names(district_names):
+        if not district_names:
+            return []
+        conn = get_db_connection(readonly=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            placeholders = ", ".join(["%s"] * len(district_names))
+            cursor.execute(f"""
+                SELECT dp.*, d.name as district_name
+                FROM dropping_points dp
+                JOIN districts d ON dp.district_id = d.id
+                WHERE d.name IN ({placeholders})
+                ORDER BY dp.id
+            """, tuple(district_names))
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_all():
+        conn = get_db_connection(readonly=True)
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT dp.*, d.name as district_name
+                FROM dropping_points dp
+                JOIN districts d ON dp.district_id = d.id
+                ORDER BY d.name, dp.name
+            """)
+            results = cursor.fetchall()
+            cursor.close()
+            return results
+        finally:
+            conn.close()
+
     @staticmethod
     def create(district_id, name, price):
         conn = get_db_connection()
@@ -44,9 +83,11 @@ class DroppingPoint:
                 "INSERT INTO dropping_points (district_id, name, price) VALUES (%s, %s, %s)",
                 (district_id, name, price)
             )
-            conn.commit()
             point_id = cursor.lastrowid
+            CatalogVersion.bump(cursor)
+            conn.commit()
             cursor.close()
+            CatalogVersion.notify()
             return point_id
         finally:
             conn.close()
@@ -0,0 +1,252 @@
+from config.database import get_db_connection
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+
+# How long a duplicate waits for the first attempt, and how long an
+# unfinished claim is honoured before another process may take it over
+WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+LEASE_SECONDS = 30
+
+PURGE_EVERY = 1000
+
+# (key, lease expiry) of the claim the running write belongs to
+_current_claim = contextvars.ContextVar("idempotency_claim", default=None)
+
+logger = logging.getLogger("idempotency")
+
+class IdempotencyConflict(Exception):
+    """The key was already used with a different request body"""
+
+class IdempotencyInProgress(Exception):
+    """The first attempt with this key is still running"""
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+class Idempotency:
+    """Replay store for retried write requests.
+
+    Completed responses live in a bounded in-process LRU backed by the
+    idempotency_keys table, both expiring after TTL_SECONDS. Duplicates in
+    the same process wait on the first attempt's event; duplicates in other
+    processes see its in-progress row and poll until it completes.
+
+    Writes call mark_committed() inside their own transaction. A key whose
+    write has committed is then held for TTL_SECONDS even if storing the
+    response fails, so an expired lease can never run the write twice.
+    """
+
+    _cache = OrderedDict()
+    _inflight = {}
+    _lock = threading.Lock()
+    _claims = 0
+
+    @staticmethod
+    def run(key, payload, fn):
+        """Run fn() -> (status_code, body) once per key; returns (status_code, body, replayed)"""
+        digest = request_hash(payload)
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            cached = Idempotency._cache_get(key)
+            if cached is not None:
+                return Idempotency._replay(cached, digest)
+
+            with Idempotency._lock:
+                event = Idempotency._inflight.get(key)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    Idempotency._inflight[key] = event
+
+            if not owner:
+                # Loop afterwards: if the first attempt failed, this one takes over
+                if not event.wait(max(deadline - time.monotonic(), 0)):
+                    raise IdempotencyInProgress("A request with this Idempotency-Key is still in progress")
+                continue
+
+            try:
+                stored, lease = Idempotency._claim(key, digest, deadline)
+                if stored is not None:
+                    Idempotency._cache_put(key, stored)
+                    return Idempotency._replay(stored, digest)
+
+                token = _current_claim.set((key, lease))
+                try:
+                    status_code, body = fn()
+                except Exception:
+                    Idempotency._release(key, lease)
+                    raise
+                finally:
+                    _current_claim.reset(token)
+                if status_code >= 500:
+                    # Server errors are not final: let the client retry for real
+                    Idempotency._release(key, lease)
+                else:
+                    stored = Idempotency._complete(key, digest, status_code, body)
+                    Idempotency._cache_put(key, stored)
+                return status_code, body, False
+            finally:
+                with Idempotency._lock:
+                    Idempotency._inflight.pop(key, None)
+                event.set()
+
+    @staticmethod
+    def _replay(stored, digest):
+        if stored['request_hash'] != digest:
+            raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+        return stored['status_code'], stored['body'], True
+
+    @staticmethod
+    def _cache_get(key):
+        with Idempotency._lock:
+            stored = Idempotency._cache.get(key)
+            if stored is None:
+                return None
+            if stored['expires_at'] <= _now():
+                del Idempotency._cache[key]
+                return None
+            Idempotency._cache.move_to_end(key)
+            return stored
+
+    @staticmethod
+    def _cache_put(key, stored):
+        with Idempotency._lock:
+            Idempotency._cache[key] = stored
+            Idempotency._cache.move_to_end(key)
+            while len(Idempotency._cache) > CACHE_SIZE:
+                Idempotency._cache.popitem(last=False)
+
+    @staticmethod
+    def _claim(key, digest, deadline):
+        """Insert an in-progress row; returns (stored response, None) if the key
+        is already done, else (None, lease expiry of the new claim)"""
+        Idempotency._claims += 1
+        if Idempotency._claims % PURGE_EVERY == 0:
+            Idempotency.purge_expired()
+
+        while True:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor(dictionary=True)
+                now = _now()
+                # Whole seconds, as DATETIME stores them, so the lease can identify the claim
+                lease = (now + timedelta(seconds=LEASE_SECONDS)).replace(microsecond=0)
+                # Expired rows, including abandoned claims, no longer hold the key
+                cursor.execute(
+                    "DELETE FROM idempotency_keys WHERE idem_key = %s AND expires_at <= %s",
+                    (key, now)
+                )
+                cursor.execute("""
+                    INSERT IGNORE INTO idempotency_keys (idem_key, request_hash, status, expires_at)
+                    VALUES (%s, %s, 'in_progress', %s)
+                """, (key, digest, lease))
+                claimed = cursor.rowcount == 1
+                row = None
+                if not claimed:
+                    cursor.execute(
+                        "SELECT request_hash, status, status_code, response, expires_at FROM idempotency_keys WHERE idem_key = %s",
+                        (key,)
+                    )
+                    rows = cursor.fetchall()
+                    row = rows[0] if rows else None
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+
+            if claimed:
+                return None, lease
+            if row is not None and row['status'] == 'completed':
+                return {
+                    'request_hash': row['request_hash'],
+                    'status_code': row['status_code'],
+                    'body': json.loads(row['response']),
+                    'expires_at': row['expires_at']
+                }, None
+            if row is not None and row['request_hash'] != digest:
+                raise IdempotencyConflict("Idempotency-Key was already used with a different request")
+            if time.monotonic() >= deadline:
+                raise IdempotencyInProgress("A request with this Idempotency-Key is still in progress")
+            time.sleep(0.05)
+
+    @staticmethod
+    def mark_committed(cursor):
+        """Inside the write's transaction: hold the running key until its response is stored.
+
+        Does nothing outside Idempotency.run(). Raises IdempotencyInProgress,
+        so the caller rolls back, if the lease expired and another attempt
+        took the key over.
+        """
+        claim = _current_claim.get()
+        if claim is None:
+            return
+        key, lease = claim
+        cursor.execute("""
+            UPDATE idempotency_keys SET status = 'committed', expires_at = %s
+            WHERE idem_key = %s AND status = 'in_progress' AND expires_at = %s
+        """, (_now() + timedelta(seconds=TTL_SECONDS), key, lease))
+        if cursor.rowcount != 1:
+            raise IdempotencyInProgress("Idempotency-Key was taken over by another attempt")
+
+    @staticmethod
+    def _complete(key, digest, status_code, body):
+        expires_at = _now() + timedelta(seconds=TTL_SECONDS)
+        stored = {'request_hash': digest, 'status_code': status_code, 'body': body, 'expires_at': expires_at}
+        try:
+            conn = get_db_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    UPDATE idempotency_keys
+                    SET status = 'completed', status_code = %s, response = %s, expires_at = %s
+                    WHERE idem_key = %s
+                """, (status_code, json.dumps(body), expires_at, key))
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception:
+            # The write itself succeeded; this process can still replay it, and
+            # a committed key stays held, so other processes answer "in progress"
+            logger.exception("Failed to store the response for idempotency key %s", key)
+        return stored
+
+    @staticmethod
+    def _release(key, lease):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM idempotency_keys WHERE idem_key = %s AND status = 'in_progress' AND expires_at = %s",
+                (key, lease)
+            )
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def purge_expired():
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM idempotency_keys WHERE expires_at <= %s", (_now(),))
+            conn.commit()
+            deleted = cursor.rowcount
+            cursor.close()
+            return deleted
+        finally:
+            conn.close()
@@ -0,0 +1,208 @@
+import json
+import os
+import re
+import unicodedata
+
+from models.catalog import Catalog, CatalogSnapshot
+
+ALIASES_PATH = os.getenv(
+    "NAME_ALIASES_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'aliases.json')
+)
+
+KIND_RANK = {"district": 0, "provider": 1, "dropping_point": 2}
+
+# Trie nodes keep only this many candidates, which bounds every prefix lookup
+NODE_CAPACITY = 50
+
+# Minimum trigram similarity to suggest a name, and to silently rewrite one
+SUGGEST_THRESHOLD = 0.3
+RESOLVE_THRESHOLD = 0.5
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+def normalize(text):
+    """Lowercase, strip accents and punctuation, collapse whitespace"""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(_NON_ALNUM.sub(" ", text).split())
+
+def trigrams(term):
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def load_aliases(path=None):
+    path = path or ALIASES_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class NameIndex:
+    """Prefix trie plus trigram index over catalog names and aliases.
+
+    Every searchable term (a canonical name or an alias) points at an
+    entry: a district, a provider or a dropping point. The trie is keyed on
+    each word start of the normalized term, so "line" completes Green Line,
+    and each node stores its best candidates up front.
+    """
+
+    def __init__(self, snapshot, aliases=None):
+        aliases = load_aliases() if aliases is None else aliases
+
+        self.entries = []
+        self.terms = []
+        self.exact = {}
+
+        district_ids = {}
+        for district in snapshot.districts:
+            district_ids[district['name']] = self._add_entry({"name": district['name'], "kind": "district"})
+            for dp in snapshot.dropping_points.get(district['name'], []):
+                self._add_entry({"name": dp['name'], "kind": "dropping_point", "district": district['name']})
+
+        provider_ids = {}
+        for provider in snapshot.providers:
+            provider_ids[provider['name']] = self._add_entry({"name": provider['name'], "kind": "provider"})
+
+        for kind, targets in (("districts", district_ids), ("providers", provider_ids)):
+            for alias, canonical in aliases.get(kind, {}).items():
+                if canonical in targets:
+                    self._add_term(alias, targets[canonical])
+
+        self._build_trie()
+        self._build_trigrams()
+
+    def _add_entry(self, entry):
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        self._add_term(entry['name'], entry_id)
+        return entry_id
+
+    def _add_term(self, text, entry_id):
+        term = normalize(text)
+        if not term:
+            return
+        self.terms.append((term, entry_id))
+        self.exact.setdefault((self.entries[entry_id]['kind'], term), entry_id)
+
+    def _term_order(self, term_id):
+        term, entry_id = self.terms[term_id]
+        return (KIND_RANK[self.entries[entry_id]['kind']], len(term), term)
+
+    def _build_trie(self):
+        # Node layout: [children dict, candidate term ids]
+        self.trie = [{}, []]
+        for term_id, (term, _) in enumerate(self.terms):
+            starts = [0] + [i + 1 for i, c in enumerate(term) if c == " "]
+            for start in starts:
+                node = self.trie
+                for c in term[start:]:
+                    node = node[0].setdefault(c, [{}, []])
+                    node[1].append(term_id)
+
+        stack = [self.trie]
+        while stack:
+            node = stack.pop()
+            node[1] = sorted(set(node[1]), key=self._term_order)[:NODE_CAPACITY]
+            stack.extend(node[0].values())
+
+    def _build_trigrams(self):
+        self.grams = {}
+        self.gram_counts = []
+        for term_id, (term, _) in enumerate(self.terms):
+            grams = trigrams(term)
+            self.gram_counts.append(len(grams))
+            for gram in grams:
+                self.grams.setdefault(gram, []).append(term_id)
+
+    @staticmethod
+    def current():
+        """Index for the active catalog snapshot"""
+        return Catalog.get().index("name_index")
+
+    def _prefix(self, query):
+        node = self.trie
+        for c in query:
+            node = node[0].get(c)
+            if node is None:
+                return []
+        return node[1]
+
+    def _fuzzy(self, query, kind=None):
+        """(score, term_id) pairs by Dice similarity of trigram sets, best first"""
+        query_grams = trigrams(query)
+        overlap = {}
+        for gram in query_grams:
+            for term_id in self.grams.get(gram, ()):
+                overlap[term_id] = overlap.get(term_id, 0) + 1
+
+        scored = []
+        for term_id, common in overlap.items():
+            if kind and self.entries[self.terms[term_id][1]]['kind'] != kind:
+                continue
+            score = 2 * common / (len(query_grams) + self.gram_counts[term_id])
+            if score >= SUGGEST_THRESHOLD:
+                scored.append((score, term_id))
+        scored.sort(key=lambda item: (-item[0], self._term_order(item[1])))
+        return scored
+
+    def complete(self, query, limit=10, kind=None):
+        """Top prefix matches, topped up with fuzzy matches for typos"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        suggestions = []
+        seen = set()
+
+        def add(term_id, match, score):
+            entry_id = self.terms[term_id][1]
+            entry = self.entries[entry_id]
+            if entry_id in seen or (kind and entry['kind'] != kind):
+                return
+            seen.add(entry_id)
+            suggestions.append({**entry, "match": match, "score": round(score, 3)})
+
+        for term_id in self._prefix(query):
+            if len(suggestions) >= limit:
+                break
+            add(term_id, "exact" if self.terms[term_id][0] == query else "prefix", 1.0)
+
+        if len(suggestions) < limit and len(query) >= 3:
+            for score, term_id in self._fuzzy(query, kind):
+                if len(suggestions) >= limit:
+                    break
+                add(term_id, "fuzzy", score)
+
+        return suggestions
+
+    def resolve(self, name, kind):
+        """Canonical name for a district/provider, or None when nothing matches clearly"""
+        query = normalize(name)
+        entry_id = self.exact.get((kind, query))
+        if entry_id is not None:
+            return self.entries[entry_id]['name']
+
+        if len(query) < 3:
+            return None
+        scored = self._fuzzy(query, kind)
+        if not scored or scored[0][0] < RESOLVE_THRESHOLD:
+            return None
+        best_entry = self.terms[scored[0][1]][1]
+        # Refuse to guess between two different names scoring the same
+        for score, term_id in scored[1:]:
+            if score < scored[0][0]:
+                break
+            if self.terms[term_id][1] != best_entry:
+                return None
+        return self.entries[best_entry]['name']
+
+
+def canonical_name(name, kind):
+    """Resolve name through the current index, falling back to the input"""
+    if not name:
+        return name
+    return NameIndex.current().resolve(name, kind) or name
+
+
+CatalogSnapshot.register_index("name_index", NameIndex)
@@ -1,4 +1,5 @@
 from config.database import get_db_connection
+from models.catalog_version import CatalogVersion
 
 class ProviderRoute:
     @staticmethod
@@ -10,16 +11,18 @@ class ProviderRoute:
                 "INSERT INTO provider_routes (provider_id, district_id) VALUES (%s, %s)",
                 (provider_id, district_id)
             )
-            conn.commit()
             route_id = cursor.lastrowid
+            CatalogVersion.bump(cursor)
+            conn.commit()
             cursor.close()
+            CatalogVersion.notify()
             return route_id
         finally:
             conn.close()
 
     @staticmethod
     def get_all():
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         try:
             cursor = conn.cursor(dictionary=True)
             cursor.execute("""
@@ -0,0 +1,155 @@
+import heapq
+from array import array
+
+from models.catalog import Catalog, CatalogSnapshot
+
+INF = float("inf")
+MAX_LEGS = 4
+
+class RouteGraph:
+    """District connection graph precomputed from a catalog snapshot.
+
+    Districts are nodes. There is an edge u -> v when at least one provider
+    covers both districts, weighted by the cheapest dropping-point fare in v
+    (fares only depend on the destination). Edges are stored in CSR form:
+    the outgoing edges of node u are offsets[u]:offsets[u + 1] in targets /
+    weights / edge_providers.
+    """
+
+    def __init__(self, snapshot):
+        self.names = [d['name'] for d in snapshot.districts]
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        # Cheapest dropping point per district; -1 means nowhere to drop off
+        self.point_names = []
+        self.point_prices = array('i')
+        for name in self.names:
+            points = snapshot.dropping_points.get(name) or []
+            if points:
+                best = min(points, key=lambda dp: (dp['price'], dp['name']))
+                self.point_names.append(best['name'])
+                self.point_prices.append(best['price'])
+            else:
+                self.point_names.append(None)
+                self.point_prices.append(-1)
+
+        edges = {}
+        for provider, districts in snapshot.coverage.items():
+            nodes = [self.index[d] for d in districts if d in self.index]
+            for u in nodes:
+                for v in nodes:
+                    if u != v and self.point_prices[v] >= 0:
+                        edges.setdefault((u, v), []).append(provider)
+
+        self.offsets = array('i', [0])
+        self.targets = array('i')
+        self.weights = array('i')
+        self.edge_providers = []
+        self.edge_ids = {}
+        by_source = sorted(edges.items())
+        position = 0
+        for u in range(len(self.names)):
+            while position < len(by_source) and by_source[position][0][0] == u:
+                (_, v), providers = by_source[position]
+                self.edge_ids[(u, v)] = len(self.targets)
+                self.targets.append(v)
+                self.weights.append(self.point_prices[v])
+                self.edge_providers.append(tuple(sorted(providers)))
+                position += 1
+            self.offsets.append(len(self.targets))
+
+        # Precompute per-destination bounds so queries never pay for them
+        self._bounds = {}
+        for target in range(len(self.names)):
+            self._lower_bounds(target)
+
+    @staticmethod
+    def current():
+        """Graph for the active catalog snapshot"""
+        return Catalog.get().index("route_graph")
+
+    def _lower_bounds(self, target):
+        """bounds[r][u]: cheapest fare from u to target using at most r legs.
+
+        Computed with a hop-bounded relaxation over the CSR arrays and cached
+        for the lifetime of the snapshot.
+        """
+        bounds = self._bounds.get(target)
+        if bounds is not None:
+            return bounds
+
+        n = len(self.names)
+        previous = [INF] * n
+        previous[target] = 0
+        bounds = [previous]
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        for _ in range(MAX_LEGS):
+            current = list(previous)
+            for u in range(n):
+                best = current[u]
+                for e in range(offsets[u], offsets[u + 1]):
+                    cost = weights[e] + previous[targets[e]]
+                    if cost < best:
+                        best = cost
+                current[u] = best
+            bounds.append(current)
+            previous = current
+
+        self._bounds[target] = bounds
+        return bounds
+
+    def cheapest_itineraries(self, from_district, to_district, max_legs=2, limit=5, max_price=None):
+        """Return up to `limit` loop-free itineraries in increasing total fare.
+
+        Best-first search over partial paths, ordered by fare so far plus the
+        exact hop-bounded lower bound to the destination. Because the bound
+        is admissible, itineraries reach the destination in fare order, so
+        the search stops after the k-th one.
+        """
+        source = self.index.get(from_district)
+        target = self.index.get(to_district)
+        if source is None or target is None or source == target:
+            return []
+
+        max_legs = max(1, min(max_legs, MAX_LEGS))
+        bounds = self._lower_bounds(target)
+        if bounds[max_legs][source] == INF:
+            return []
+
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        heap = [(bounds[max_legs][source], 0, (source,))]
+        found = []
+        while heap and len(found) < limit:
+            estimate, cost, path = heapq.heappop(heap)
+            if max_price is not None and estimate > max_price:
+                break
+            u = path[-1]
+            if u == target:
+                found.append((cost, path))
+                continue
+
+            legs_left = max_legs - len(path)
+            for e in range(offsets[u], offsets[u + 1]):
+                v = targets[e]
+                remaining = bounds[legs_left][v]
+                if remaining == INF or v in path:
+                    continue
+                fare = cost + weights[e]
+                heapq.heappush(heap, (fare + remaining, fare, path + (v,)))
+
+        return [self._describe(cost, path) for cost, path in found]
+
+    def _describe(self, cost, path):
+        legs = []
+        for u, v in zip(path, path[1:]):
+            legs.append({
+                "from_district": self.names[u],
+                "to_district": self.names[v],
+                "dropping_point": self.point_names[v],
+                "fare": self.point_prices[v],
+                "providers": list(self.edge_providers[self.edge_ids[(u, v)]])
+            })
+        return {"total_fare": cost, "legs": legs}
+
+
+CatalogSnapshot.register_index("route_graph", RouteGraph)
@@ -0,0 +1,228 @@
+from config.database import get_db_connection
+from datetime import datetime, timedelta, timezone
+import os
+import secrets
+
+DEFAULT_CAPACITY = int(os.getenv("DEFAULT_TRIP_CAPACITY", "40"))
+HOLD_SECONDS = int(os.getenv("SEAT_HOLD_SECONDS", "300"))
+
+class SoldOutError(Exception):
+    pass
+
+def _now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class TripInventory:
+    """Seat counts per trip (provider, from, to, travel_date).
+
+    `reserved` counts confirmed bookings plus holds, and is only ever moved
+    by a conditional UPDATE on the trip row, so concurrent bookings for the
+    same trip serialize on one short row lock instead of counting booking
+    rows. Expired holds are reclaimed lazily, per trip, when a reservation
+    finds the trip full, so no sweeper ever scans holds or bookings.
+    """
+
+    @staticmethod
+    def _trip_id(cursor, bus_provider, from_district, to_district, travel_date):
+        trip = (bus_provider, from_district, to_district, travel_date)
+        cursor.execute("""
+            SELECT id FROM trip_inventory
+            WHERE bus_provider = %s AND from_district = %s AND to_district = %s AND travel_date = %s
+        """, trip)
+        rows = cursor.fetchall()
+        if rows:
+            return rows[0][0]
+
+        # The first reservation for a trip creates its row with the default
+        # capacity. Bookings confirmed before seat inventory existed are
+        # counted once by backfill_inventory.py, not here on the hot path.
+        cursor.execute("""
+            INSERT IGNORE INTO trip_inventory
+            (bus_provider, from_district, to_district, travel_date, capacity, reserved)
+            VALUES (%s, %s, %s, %s, %s, 0)
+        """, (*trip, DEFAULT_CAPACITY))
+        # A locking read sees a row another transaction inserted after this
+        # one's snapshot was taken, which a plain SELECT on MySQL would not
+        cursor.execute("""
+            SELECT id FROM trip_inventory
+            WHERE bus_provider = %s AND from_district = %s AND to_district = %s AND travel_date = %s
+            FOR UPDATE
+        """, trip)
+        return cursor.fetchall()[0][0]
+
+    @staticmethod
+    def _try_take(cursor, trip_id):
+        cursor.execute(
+            "UPDATE trip_inventory SET reserved = reserved + 1 WHERE id = %s AND reserved < capacity",
+            (trip_id,)
+        )
+        return cursor.rowcount == 1
+
+    @staticmethod
+    def _reclaim_expired(cursor, trip_id):
+        cursor.execute(
+            "DELETE FROM seat_holds WHERE trip_id = %s AND expires_at <= %s",
+            (trip_id, _now())
+        )
+        expired = cursor.rowcount
+        if expired > 0:
+            cursor.execute(
+                "UPDATE trip_inventory SET reserved = reserved - %s WHERE id = %s",
+                (expired, trip_id)
+            )
+        return expired
+
+    @staticmethod
+    def reserve(cursor, bus_provider, from_district, to_district, travel_date):
+        """Take one seat inside the caller's transaction; raises SoldOutError"""
+        trip_id = TripInventory._trip_id(cursor, bus_provider, from_district, to_district, travel_date)
+        if TripInventory._try_take(cursor, trip_id):
+            return trip_id
+        if TripInventory._reclaim_expired(cursor, trip_id) and TripInventory._try_take(cursor, trip_id):
+            return trip_id
+        raise SoldOutError("No seats left on this trip")
+
+    @staticmethod
+    def claim_hold(cursor, hold_id, bus_provider, from_district, to_district, travel_date):
+        """Turn a live hold into a booked seat; False if it expired or belongs to another trip"""
+        if not hold_id:
+            return False
+        cursor.execute("""
+            DELETE FROM seat_holds
+            WHERE hold_id = %s AND expires_at > %s AND trip_id = (
+                SELECT id FROM trip_inventory
+                WHERE bus_provider = %s AND from_district = %s AND to_district = %s AND travel_date = %s
+            )
+        """, (hold_id, _now(), bus_provider, from_district, to_district, travel_date))
+        return cursor.rowcount == 1
+
+    @staticmethod
+    def release(cursor, bus_provider, from_district, to_district, travel_date):
+        """Give a cancelled booking's seat back"""
+        cursor.execute("""
+            UPDATE trip_inventory SET reserved = reserved - 1
+            WHERE bus_provider = %s AND from_district = %s AND to_district = %s AND travel_date = %s
+              AND reserved > 0
+        """, (bus_provider, from_district, to_district, travel_date))
+
+    @staticmethod
+    def hold(bus_provider, from_district, to_district, travel_date, seconds=None):
+        """Hold one seat for a few minutes while the customer checks out"""
+        hold_id = secrets.token_hex(8)
+        expires_at = _now() + timedelta(seconds=seconds or HOLD_SECONDS)
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            trip_id = TripInventory.reserve(cursor, bus_provider, from_district, to_district, travel_date)
+            cursor.execute(
+                "INSERT INTO seat_holds (hold_id, trip_id, expires_at) VALUES (%s, %s, %s)",
+                (hold_id, trip_id, expires_at)
+            )
+            conn.commit()
+            cursor.close()
+            return {"hold_id": hold_id, "expires_at": expires_at}
+        finally:
+            conn.close()
+
+    @staticmethod
+    def set_capacity(bus_provider, from_district, to_district, travel_date, capacity):
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            trip_id = TripInventory._trip_id(cursor, bus_provider, from_district, to_district, travel_date)
+            cursor.execute(
+                "UPDATE trip_inventory SET capacity = %s WHERE id = %s",
+                (capacity, trip_id)
+            )
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def rebuild():
+        """Recount reserved for every trip from confirmed bookings and live holds.
+
+        For databases upgraded with bookings already in place, and to repair
+        drift. Trips with bookings but no inventory row get one.
+        """
+        now = _now()
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM seat_holds WHERE expires_at <= %s", (now,))
+            cursor.execute("""
+                INSERT IGNORE INTO trip_inventory
+                (bus_provider, from_district, to_district, travel_date, capacity, reserved)
+                SELECT bus_provider, from_district, to_district, travel_date, %s, 0
+                FROM bookings
+                WHERE status = 'confirmed'
+                GROUP BY bus_provider, from_district, to_district, travel_date
+            """, (DEFAULT_CAPACITY,))
+            cursor.execute("""
+                UPDATE trip_inventory SET reserved = (
+                    SELECT COUNT(*) FROM bookings b
+                    WHERE b.bus_provider = trip_inventory.bus_provider
+                      AND b.from_district = trip_inventory.from_district
+                      AND b.to_district = trip_inventory.to_district
+                      AND b.travel_date = trip_inventory.travel_date
+                      AND b.status = 'confirmed'
+                ) + (
+                    SELECT COUNT(*) FROM seat_holds sh WHERE sh.trip_id = trip_inventory.id
+                )
+            """)
+            trips = cursor.rowcount
+            conn.commit()
+            cursor.close()
+            return trips
+        finally:
+            conn.close()
+
+    @staticmethod
+    def purge_before(travel_date):
+        """Drop holds and inventory rows for trips that departed before travel_date.
+
+        Expired holds are otherwise only reclaimed when a trip fills up, so
+        trips that never did would keep theirs forever.
+        """
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                DELETE FROM seat_holds WHERE trip_id IN (
+                    SELECT id FROM trip_inventory WHERE travel_date < %s
+                )
+            """, (travel_date,))
+            holds = cursor.rowcount
+            cursor.execute("DELETE FROM trip_inventory WHERE travel_date < %s", (travel_date,))
+            conn.commit()
+            cursor.close()
+            return holds
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_availability(bus_provider, from_district, to_district, travel_date):
+        """Seats left, from the trip row and its expired holds only"""
+        conn = get_db_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT ti.capacity, ti.reserved,
+                       (SELECT COUNT(*) FROM seat_holds sh
+                        WHERE sh.trip_id = ti.id AND sh.expires_at <= %s) as expired_holds
+                FROM trip_inventory ti
+                WHERE ti.bus_provider = %s AND ti.from_district = %s AND ti.to_district = %s
+                  AND ti.travel_date = %s
+            """, (_now(), bus_provider, from_district, to_district, travel_date))
+            row = cursor.fetchone()
+            cursor.close()
+        finally:
+            conn.close()
+
+        if row is None:
+            return {"capacity": DEFAULT_CAPACITY, "available": DEFAULT_CAPACITY}
+        return {
+            "capacity": row['capacity'],
+            "available": max(row['capacity'] - row['reserved'] + row['expired_holds'], 0)
+        }
@@ -0,0 +1,72 @@
+import sys
+import time
+
+from monitoring import profiler
+from monitoring.metrics import db_queries_total, db_query_duration_seconds
+
+
+def _caller(depth=2):
+    """(method name, frame) of the model method running a statement"""
+    frame = sys._getframe(depth)
+    # co_qualname gives "Booking.create" style names for the model methods
+    return getattr(frame.f_code, "co_qualname", frame.f_code.co_name), frame
+
+
+class InstrumentedCursor:
+    """Cursor proxy that times every statement against the calling model method"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._query = None
+
+    def _record(self, method, frame, sql, params, elapsed):
+        labels = (method,)
+        db_queries_total.inc(labels)
+        db_query_duration_seconds.observe(labels, elapsed)
+        # Writes report rowcount; rows read are counted as they are fetched
+        rows = 0
+        if self._cursor.description is None and self._cursor.rowcount > 0:
+            rows = self._cursor.rowcount
+        self._query = profiler.record(method, sql, params, elapsed, rows, frame)
+
+    def execute(self, sql, params=None):
+        method, frame = _caller()
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(sql, params)
+        finally:
+            self._record(method, frame, sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        method, frame = _caller()
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(sql, seq_of_params)
+        finally:
+            self._record(method, frame, sql, seq_of_params, time.perf_counter() - start)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if self._query is not None and row is not None:
+            self._query.rows += 1
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        if self._query is not None:
+            self._query.rows += len(rows)
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
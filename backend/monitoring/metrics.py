@@ -0,0 +1,203 @@
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds, spanning sub-millisecond SQLite reads to multi-second LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labels, extra=()):
+    pairs = list(zip(labelnames, labels)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    """Base for metrics whose samples live in per-thread shards.
+
+    Every thread writes only to its own shard, so the hot path takes no
+    lock; shards are merged when /metrics is scraped. The registration
+    lock is only taken the first time a thread touches a metric.
+    """
+
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshot(self):
+        with self._lock:
+            shards = list(self._shards)
+        # Copy each shard before iterating: its owning thread may be adding keys
+        return [dict(shard) for shard in shards]
+
+    def collect(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.collect())
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, labels=(), amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def collect(self):
+        totals = {}
+        for shard in self._snapshot():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(totals.items())
+        ]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        shard = self._shard()
+        state = shard.get(labels)
+        if state is None:
+            # [per-bucket counts..., +Inf count, sum]
+            state = [0] * (len(self.buckets) + 1) + [0.0]
+            shard[labels] = state
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def time(self, labels):
+        return _Timer(self, labels)
+
+    def collect(self):
+        totals = {}
+        for shard in self._snapshot():
+            for labels, state in shard.items():
+                merged = totals.setdefault(labels, [0] * len(state))
+                for i, value in enumerate(state):
+                    merged[i] += value
+
+        lines = []
+        for labels, state in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = _format_labels(self.labelnames, labels, [("le", _format_value(float(bound)))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {_format_value(float(state[-1]))}")
+            lines.append(f"{self.name}_count{label_str} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(self.labels, time.perf_counter() - self.start)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._callbacks = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, callback):
+        """Register a callable returning extra exposition lines at scrape time"""
+        self._callbacks.append(callback)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for callback in self._callbacks:
+            lines.extend(callback())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status code.",
+    ("method", "route", "status")
+)
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route")
+)
+db_queries_total = registry.counter(
+    "db_queries_total", "SQL statements executed, by model method.", ("method",)
+)
+db_query_duration_seconds = registry.histogram(
+    "db_query_duration_seconds", "SQL statement execution time, by model method.", ("method",)
+)
+db_pool_wait_seconds = registry.histogram(
+    "db_pool_wait_seconds", "Time spent checking a connection out of the backend pool.", ("backend",)
+)
+db_reads_total = registry.counter(
+    "db_reads_total", "Read-only connections, by whether they were served by the replica or the primary.",
+    ("target",)
+)
+llm_request_duration_seconds = registry.histogram(
+    "llm_request_duration_seconds", "LLM completion latency.", ("model", "outcome")
+)
+llm_tokens_total = registry.counter(
+    "llm_tokens_total", "LLM tokens consumed, split into prompt and completion.", ("model", "type")
+)
+chat_document_lookups_total = registry.counter(
+    "chat_document_lookups_total", "Chat document retrievals, by whether they were searched or reused from the session.",
+    ("source",)
+)
@@ -0,0 +1,37 @@
+import time
+
+from monitoring.metrics import http_requests_total, http_request_duration_seconds
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware recording request counts and latency per route.
+
+    Requests are labelled with the route template (/my-bookings/{phone})
+    rather than the raw path so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            route_path = route.path if route is not None else "<unmatched>"
+            method = scope["method"]
+            http_requests_total.inc((method, route_path, str(status)))
+            http_request_duration_seconds.observe((method, route_path), time.perf_counter() - start)
@@ -0,0 +1,126 @@
+import contextvars
+import logging
+import os
+import random
+import time
+from collections import Counter
+
+logger = logging.getLogger("db.profiler")
+
+# Fraction of requests to profile: 1.0 in development, something small in production
+SAMPLE_RATE = float(os.getenv("DB_PROFILE_SAMPLE_RATE", "0"))
+
+# Statements slower than this are logged with their parameters; unset disables the log
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS")) if os.getenv("DB_SLOW_QUERY_MS") else None
+
+# A model method called this many times in one request is reported as a likely N+1
+REPEAT_THRESHOLD = int(os.getenv("DB_PROFILE_REPEAT_THRESHOLD", "5"))
+
+_current_profile = contextvars.ContextVar("db_query_profile", default=None)
+
+
+class QueryRecord:
+    __slots__ = ("method", "sql", "params", "elapsed", "rows")
+
+    def __init__(self, method, sql, params, elapsed, rows):
+        self.method = method
+        self.sql = sql
+        self.params = params
+        self.elapsed = elapsed
+        self.rows = rows
+
+
+class QueryProfile:
+    def __init__(self):
+        self.statements = []
+        self.calls = Counter()
+        self._last_frame = {}
+
+    def add(self, query, frame=None):
+        self.statements.append(query)
+        # Statements from the same frame belong to one call of the method; the
+        # frame is held until the next call so its identity cannot be reused
+        if frame is None or self._last_frame.get(query.method) is not frame:
+            self._last_frame[query.method] = frame
+            self.calls[query.method] += 1
+
+    @property
+    def total_time(self):
+        return sum(record.elapsed for record in self.statements)
+
+    def repeated_methods(self, threshold=None):
+        """Model methods called at least `threshold` times in this request"""
+        threshold = threshold or REPEAT_THRESHOLD
+        return {method: count for method, count in self.calls.items() if count >= threshold}
+
+
+def start_profile():
+    profile = QueryProfile()
+    return profile, _current_profile.set(profile)
+
+
+def stop_profile(token):
+    _current_profile.reset(token)
+
+
+def current_profile():
+    return _current_profile.get()
+
+
+def record(method, sql, params, elapsed, rows, frame=None):
+    """Called by the instrumented cursor after every statement; frame is the caller's"""
+    if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning(
+            "Slow query (%.1f ms) in %s: %s params=%r",
+            elapsed * 1000, method, " ".join(sql.split()), params
+        )
+
+    profile = _current_profile.get()
+    if profile is None:
+        return None
+    query = QueryRecord(method, sql, params, elapsed, rows)
+    profile.add(query, frame)
+    return query
+
+
+class QueryProfilerMiddleware:
+    """Profiles a sample of requests and reports their SQL in response headers.
+
+    Sampled responses carry X-DB-Queries and X-DB-Time-ms. Model methods that
+    are called repeatedly within one request (a query inside a loop) are logged so
+    N+1 patterns show up without reading the code.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or SAMPLE_RATE <= 0 or random.random() >= SAMPLE_RATE:
+            await self.app(scope, receive, send)
+            return
+
+        profile, token = start_profile()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(len(profile.statements)).encode()))
+                headers.append((b"x-db-time-ms", f"{profile.total_time * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop_profile(token)
+            for method, count in profile.repeated_methods().items():
+                logger.warning(
+                    "%s %s: %s was called %d times in one request (possible N+1)",
+                    scope["method"], scope["path"], method, count
+                )
+            logger.debug(
+                "%s %s: %d queries, %.2f ms in DB, %.2f ms total",
+                scope["method"], scope["path"], len(profile.statements),
+                profile.total_time * 1000, (time.perf_counter() - start) * 1000
+            )
@@ -0,0 +1,21 @@
+import argparse
+from dotenv import load_dotenv
+from config.database import ensure_schema
+from models.booking_stats import BookingStats
+
+load_dotenv()
+
+def rebuild_analytics(date_from=None, date_to=None):
+    ensure_schema()
+
+    span = f" for travel dates {date_from or 'start'} to {date_to or 'end'}" if date_from or date_to else ""
+    print(f"Rebuilding booking analytics{span}")
+    rows = BookingStats.rebuild(date_from, date_to)
+    print(f"Wrote {rows} rollup rows.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute booking_daily_stats from the bookings table")
+    parser.add_argument("--from", dest="date_from", help="first travel date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", help="last travel date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    rebuild_analytics(args.date_from, args.date_to)
@@ -1,7 +1,7 @@
 import json
 import os
 from dotenv import load_dotenv
-from config.database import get_db_connection, init_database
+from config.database import get_db_connection, init_database, use_primary
 from models.district import District
 from models.dropping_point import DroppingPoint
 from models.bus_provider import BusProvider
@@ -107,4 +107,6 @@ def seed_database():
     print("\nNote: If you see 'already exists' messages, that's normal for re-runs.")
 
 if __name__ == "__main__":
-    seed_database()
+    # Lookups follow the inserts they depend on, so keep them off the replica
+    with use_primary():
+        seed_database()
@@ -1,3 +1,5 @@
+import { Bootstrap } from './types';
+
 const API_URL = 'http://localhost:8000';
 
 export const searchBuses = async (fromDistrict: string, toDistrict: string, maxPrice?: number) => {
@@ -48,23 +50,39 @@ export const cancelBooking = async (bookingReference: string, phone: string) =>
   return response.json();
 };
 
+// One request per page load for the catalog; the browser revalidates it by ETag
+let bootstrapPromise: Promise<Bootstrap> | null = null;
+
+export const getBootstrap = (): Promise<Bootstrap> => {
+  if (!bootstrapPromise) {
+    bootstrapPromise = fetch(`${API_URL}/bootstrap`).then((response) => {
+      if (!response.ok) throw new Error(`Bootstrap failed: ${response.status}`);
+      return response.json();
+    });
+    bootstrapPromise.catch(() => {
+      bootstrapPromise = null;
+    });
+  }
+  return bootstrapPromise;
+};
+
 export const getDistricts = async () => {
-  const response = await fetch(`${API_URL}/districts`);
-  return response.json();
+  const { districts } = await getBootstrap();
+  return { districts };
 };
 
-export const sendChatMessage = async (message: string) => {
+export const sendChatMessage = async (message: string, sessionId?: string | null) => {
   const response = await fetch(`${API_URL}/chat`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ message })
+    body: JSON.stringify({ message, session_id: sessionId })
   });
   return response.json();
 };
 
 export const getBusProviders = async () => {
-  const response = await fetch(`${API_URL}/bus-providers`);
-  return response.json();
+  const { providers } = await getBootstrap();
+  return { providers };
 };
 
 export const getProviderDetails = async (providerName: string) => {
@@ -73,7 +91,9 @@ export const getProviderDetails = async (providerName: string) => {
 };
 
 export const getProvidersByDistrict = async (districtName: string) => {
-  const response = await fetch(`${API_URL}/bus-providers/district/${encodeURIComponent(districtName)}`);
-  return response.json();
+  const { providers, coverage } = await getBootstrap();
+  return {
+    providers: providers.filter((provider) => (coverage[provider.name] || []).includes(districtName))
+  };
 };
 
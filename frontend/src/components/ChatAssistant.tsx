@@ -16,6 +16,8 @@ export default function ChatAssistant() {
   ]);
   const [input, setInput] = useState('');
   const [loading, setLoading] = useState(false);
+  // The server keeps the conversation context; follow-ups only send the new message
+  const [sessionId, setSessionId] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -36,7 +38,8 @@ export default function ChatAssistant() {
     setLoading(true);
 
     try {
-      const data = await sendChatMessage(userMessage);
+      const data = await sendChatMessage(userMessage, sessionId);
+      if (data.session_id) setSessionId(data.session_id);
       setMessages(prev => [...prev, { role: 'assistant', content: data.response }]);
     } catch (error) {
       console.error('Chat failed:', error);
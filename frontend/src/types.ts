@@ -1,7 +1,7 @@
 export interface District {
   id: string;
   name: string;
-  created_at: string;
+  created_at?: string;
 }
 
 export interface ChatMessage {
@@ -14,6 +14,20 @@ export interface BusProvider {
   name: string;
 }
 
+export interface Bootstrap {
+  version: number;
+  districts: District[];
+  dropping_points: {
+    [district: string]: {
+      id: number;
+      name: string;
+      price: number;
+    }[];
+  };
+  providers: (BusProvider & { contact_info: string; address: string })[];
+  coverage: { [provider: string]: string[] };
+}
+
 export interface ProviderDetails {
   id: number;
   name: string;
@@ -0,0 +1,813 @@
+import gzip
+import json
+import sqlite3
+import sys
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import logging
+import re
+from types import SimpleNamespace
+
+import anyio.to_thread
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+# Add the backend directory to the python path
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from config.backends import create_backend
+from config import database, lifecycle
+from config.database import get_db_connection, init_database, set_backend, set_replica, use_primary
+from controllers.booking_controller import BookingController
+from controllers.bus_controller import BusController
+from controllers.chat_controller import ChatController
+from middleware.admission import AdmissionControlMiddleware
+from monitoring import profiler
+from monitoring.profiler import QueryProfilerMiddleware
+from models.booking import Booking
+from models.booking_archive import BookingArchive
+from models.booking_change import BookingChange
+from models.bootstrap import BootstrapPayload
+from models.booking_stats import BookingStats
+from models.bus_document import BusDocument
+from models.bus_provider import BusProvider
+from models.catalog import Catalog
+from models.catalog_version import CatalogVersion
+from models import idempotency, trip_inventory
+from models.idempotency import Idempotency, IdempotencyConflict, IdempotencyInProgress
+from models.district import District
+from models.dropping_point import DroppingPoint
+from models.provider_route import ProviderRoute
+from models.trip_inventory import SoldOutError, TripInventory
+
+TABLES = ["schema_version", "catalog_version", "booking_change_sequence", "booking_changes", "booking_daily_stats", "idempotency_keys", "seat_holds", "trip_inventory", "bookings_archive", "bookings", "bus_documents", "provider_routes", "dropping_points", "bus_providers", "districts"]
+
+
+def _reset_tables():
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    for table in TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+@pytest.fixture(params=["sqlite", "mysql"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        backend = create_backend("sqlite", path=str(tmp_path / "test.db"))
+    else:
+        # Only ever run against a throwaway database: the tables are dropped
+        database = os.getenv("TEST_MYSQL_DATABASE")
+        if not database or os.getenv("DB_PASSWORD") is None:
+            pytest.skip("set TEST_MYSQL_DATABASE and DB_PASSWORD to run against MySQL")
+        backend = create_backend(
+            "mysql",
+            pool_name=f"test_pool_{uuid.uuid4().hex[:8]}",
+            host=os.getenv("DB_HOST", "localhost"),
+            port=int(os.getenv("DB_PORT", "3306")),
+            user=os.getenv("DB_USER", "root"),
+            password=os.getenv("DB_PASSWORD"),
+            database=database
+        )
+
+    set_backend(backend)
+    Catalog._snapshot = None
+    Idempotency._cache.clear()
+    _reset_tables()
+    init_database()
+    yield backend
+    _reset_tables()
+    set_backend(None)
+
+
+@pytest.fixture
+def catalog(backend):
+    dhaka = District.create("Dhaka")
+    sylhet = District.create("Sylhet")
+    DroppingPoint.create(dhaka, "Gabtoli", 500)
+    DroppingPoint.create(sylhet, "Zindabazar", 700)
+    DroppingPoint.create(sylhet, "Bimanbandar", 720)
+
+    hanif = BusProvider.create("Hanif", "Phone: 01713402673", "Kallyanpur, Dhaka", "")
+    ena = BusProvider.create("Ena", "Phone: 01958000000", "Mohakhali, Dhaka", "")
+    ProviderRoute.create(hanif, dhaka)
+    ProviderRoute.create(hanif, sylhet)
+    ProviderRoute.create(ena, dhaka)
+
+    BusDocument.create("Hanif", "Hanif Enterprise\nCancellation Policy: 24 hours notice")
+    return {"dhaka": dhaka, "sylhet": sylhet, "hanif": hanif, "ena": ena}
+
+
+@pytest.fixture
+def client(catalog):
+    import main
+    return TestClient(main.app)
+
+
+def test_district_lookups(catalog):
+    assert [d['name'] for d in District.get_all()] == ["Dhaka", "Sylhet"]
+    assert District.get_by_name("Sylhet")['id'] == catalog['sylhet']
+    assert District.get_by_name("Nowhere") is None
+
+
+def test_dropping_points(catalog):
+    points = DroppingPoint.get_by_district_name("Sylhet")
+    assert sorted((p['name'], p['price']) for p in points) == [("Bimanbandar", 720), ("Zindabazar", 700)]
+    assert all(p['district_name'] == "Sylhet" for p in points)
+    assert len(DroppingPoint.get_by_district_id(catalog['dhaka'])) == 1
+
+
+def test_provider_coverage(catalog):
+    assert [p['name'] for p in BusProvider.get_all()] == ["Ena", "Hanif"]
+    assert {p['name'] for p in BusProvider.get_providers_serving_district("Dhaka")} == {"Ena", "Hanif"}
+    assert BusProvider.get_provider_routes("Hanif") == {
+        "Dhaka → Sylhet": [
+            {"dropping_point": "Bimanbandar", "price": 720},
+            {"dropping_point": "Zindabazar", "price": 700},
+        ],
+        "Sylhet → Dhaka": [{"dropping_point": "Gabtoli", "price": 500}],
+    }
+    assert len(ProviderRoute.get_all()) == 3
+
+
+def test_search_buses(catalog):
+    results = BusController.search_buses("Dhaka", "Sylhet", max_price=710)
+    assert len(results) == 1
+    assert results[0]['provider'] == "Hanif"
+    assert results[0]['dropping_point'] == "Zindabazar"
+    assert results[0]['provider_details']['id'] == catalog['hanif']
+
+
+def test_document_search(catalog):
+    docs = BusDocument.search("Cancellation Policy", limit=3)
+    assert [d['provider_name'] for d in docs] == ["Hanif"]
+    assert BusDocument.search("Refund", limit=3) == []
+
+
+def test_booking_lifecycle(catalog):
+    result = BookingController.create_booking(
+        "Rahim", "01700000000", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2099-01-15", 700
+    )
+    booking = result['booking']
+    assert booking['booking_reference'] == result['booking_reference']
+    assert booking['status'] == "confirmed"
+    assert str(booking['travel_date']) == "2099-01-15"
+
+    assert [b['booking_reference'] for b in Booking.get_by_phone("01700000000")] == [result['booking_reference']]
+    assert Booking.get_by_reference_and_phone(result['booking_reference'], "01800000000") is None
+    assert Booking.cancel(result['booking_reference'], "01800000000") is False
+    assert Booking.get_by_phone("01700000000")[0]['status'] == "confirmed"
+
+    BookingController.cancel_booking(result['booking_reference'], "01700000000")
+    assert Booking.get_by_phone("01700000000")[0]['status'] == "cancelled"
+    with pytest.raises(ValueError):
+        BookingController.cancel_booking(result['booking_reference'], "01700000000")
+
+
+def test_catalog_writes_bump_version(catalog):
+    snapshot = Catalog.get()
+    assert snapshot.version == CatalogVersion.get()
+    assert snapshot.coverage["Hanif"] == ["Dhaka", "Sylhet"]
+    assert Catalog.refresh_if_stale() is False
+
+    District.create("Khulna")
+    assert CatalogVersion.get() == snapshot.version + 1
+    assert Catalog.refresh_if_stale() is True
+    assert "Khulna" in Catalog.get().dropping_points
+
+
+def test_search_connections(catalog):
+    khulna = District.create("Khulna")
+    DroppingPoint.create(khulna, "Daulatpur", 400)
+    green_line = BusProvider.create("Green Line")
+    ProviderRoute.create(green_line, catalog['sylhet'])
+    ProviderRoute.create(green_line, khulna)
+    Catalog.refresh_if_stale()
+
+    assert BusController.search_buses("Dhaka", "Khulna") == []
+    assert BusController.search_connections("Dhaka", "Khulna", max_legs=1) == []
+
+    itineraries = BusController.search_connections("Dhaka", "Khulna", max_legs=2)
+    assert len(itineraries) == 1
+    assert itineraries[0]['total_fare'] == 1100
+    assert [(leg['to_district'], leg['providers']) for leg in itineraries[0]['legs']] == [
+        ("Sylhet", ["Hanif"]),
+        ("Khulna", ["Green Line"]),
+    ]
+
+
+def test_names_are_canonicalized(catalog):
+    assert BusController.search_buses("dhaka", " SYLHET ") == BusController.search_buses("Dhaka", "Sylhet")
+    assert BusController.get_provider_details("hanif")['name'] == "Hanif"
+
+    suggestions = BusController.autocomplete("syl")
+    assert [(s['name'], s['kind'], s['match']) for s in suggestions] == [("Sylhet", "district", "prefix")]
+    assert BusController.autocomplete("Zindabazr")[0]['name'] == "Zindabazar"
+
+
+BATCH_SEARCHES = [
+    {"from_district": "Sylhet", "to_district": "Dhaka"},
+    {"from_district": "Dhaka", "to_district": "Sylhet", "max_price": 710},
+    {"from_district": "Dhaka", "to_district": "Khulna"},
+    {"from_district": "Dhaka", "to_district": "Sylhet"},
+    {"from_district": "Sylhet", "to_district": "Dhaka"},
+]
+
+
+def test_batch_search_matches_single_searches(client):
+    singles = [client.post("/search-buses", json=search).json() for search in BATCH_SEARCHES]
+    assert [len(single['results']) for single in singles] == [1, 1, 0, 2, 1]
+
+    response = client.post("/search-buses/batch", json={"searches": BATCH_SEARCHES})
+    assert response.status_code == 200
+    assert response.json()['searches'] == singles
+
+    searches = [(s['from_district'], s['to_district'], s.get('max_price')) for s in BATCH_SEARCHES]
+    assert BusController.search_buses_batch(searches) == [
+        BusController.search_buses(*search) for search in searches
+    ]
+
+
+def test_batch_search_stream(client):
+    response = client.post("/search-buses/batch?stream=true", json={"searches": BATCH_SEARCHES})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    assert [json.loads(line) for line in lines] == client.post(
+        "/search-buses/batch", json={"searches": BATCH_SEARCHES}
+    ).json()['searches']
+
+
+def test_seat_inventory(catalog):
+    trip = ("Hanif", "Dhaka", "Sylhet", "2026-02-01")
+    TripInventory.set_capacity(*trip, 2)
+
+    # An expired hold still occupies its seat until a full trip reclaims it
+    TripInventory.hold(*trip, seconds=-1)
+    live_hold = TripInventory.hold(*trip)
+    assert TripInventory.get_availability(*trip) == {"capacity": 2, "available": 1}
+
+    booking = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2026-02-01", 700)
+    with pytest.raises(SoldOutError):
+        BookingController.create_booking("Karim", "018", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2026-02-01", 700)
+
+    BookingController.create_booking("Karim", "018", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2026-02-01", 700,
+                                      hold_id=live_hold['hold_id'])
+    assert TripInventory.get_availability(*trip)['available'] == 0
+
+    BookingController.cancel_booking(booking['booking_reference'], "017")
+    assert TripInventory.get_availability(*trip)['available'] == 1
+
+
+def _insert_legacy_booking(reference, travel_date):
+    # A confirmed booking written before seat inventory existed
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO bookings (booking_reference, customer_name, customer_phone, from_district,
+                              to_district, dropping_point, bus_provider, travel_date, fare, status)
+        VALUES (%s, 'Old', '016', 'Dhaka', 'Sylhet', 'Zindabazar', 'Hanif', %s, 700, 'confirmed')
+    """, (reference, travel_date))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def test_inventory_counts_existing_bookings(catalog):
+    trip = ("Hanif", "Dhaka", "Sylhet", "2026-04-01")
+    _insert_legacy_booking("LEGACY01", "2026-04-01")
+    _insert_legacy_booking("LEGACY02", "2026-04-01")
+    # The backfill creates rows for trips that only have older bookings
+    TripInventory.rebuild()
+    TripInventory.set_capacity(*trip, 3)
+    assert TripInventory.get_availability(*trip)['available'] == 1
+
+    # Cancelling an old booking gives back a seat it really held
+    BookingController.cancel_booking("LEGACY01", "016")
+    assert TripInventory.get_availability(*trip)['available'] == 2
+
+    # Trips tracked before their older bookings were counted are repaired too
+    tracked = ("Hanif", "Dhaka", "Sylhet", "2026-04-02")
+    TripInventory.set_capacity(*tracked, 3)
+    _insert_legacy_booking("LEGACY03", "2026-04-02")
+    assert TripInventory.get_availability(*tracked)['available'] == 3
+    TripInventory.rebuild()
+    assert TripInventory.get_availability(*tracked)['available'] == 2
+    assert TripInventory.get_availability(*trip)['available'] == 2
+
+
+def test_concurrent_bookings_fill_trip_exactly(catalog, monkeypatch):
+    import main
+    trip = ("Hanif", "Dhaka", "Sylhet", "2026-05-01")
+    capacity, attempts = 10, 30
+    # The racing bookings also create the trip's inventory row
+    monkeypatch.setattr(trip_inventory, "DEFAULT_CAPACITY", capacity)
+    start = threading.Barrier(attempts)
+    statuses = []
+
+    def book(i):
+        request = main.BookingRequest(
+            customer_name=f"Passenger {i}", customer_phone=f"0170000{i:04d}", from_district="Dhaka",
+            to_district="Sylhet", dropping_point="Zindabazar", bus_provider="Hanif",
+            travel_date="2026-05-01", fare=700
+        )
+        start.wait()
+        statuses.append(main._book_ticket(request)[0])
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(attempts)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [200] * capacity + [409] * (attempts - capacity)
+    assert TripInventory.get_availability(*trip) == {"capacity": capacity, "available": 0}
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT reserved FROM trip_inventory WHERE travel_date = %s", ("2026-05-01",))
+    assert cursor.fetchall() == [(capacity,)]
+    cursor.close()
+    conn.close()
+
+
+def test_purge_departed_trips(catalog):
+    TripInventory.hold("Hanif", "Dhaka", "Sylhet", "2020-01-01", seconds=-1)
+    TripInventory.hold("Hanif", "Dhaka", "Sylhet", "2099-01-01")
+    assert TripInventory.purge_before("2026-01-01") == 1
+    assert TripInventory.get_availability("Hanif", "Dhaka", "Sylhet", "2099-01-01")['available'] == 39
+
+
+def test_idempotent_replay(backend):
+    calls = []
+
+    def book():
+        calls.append(1)
+        return 200, {"booking_reference": f"REF{len(calls)}"}
+
+    assert Idempotency.run("book-ticket:abc", {"fare": 700}, book) == (200, {"booking_reference": "REF1"}, False)
+    assert Idempotency.run("book-ticket:abc", {"fare": 700}, book) == (200, {"booking_reference": "REF1"}, True)
+
+    # Replays survive losing the in-process cache, e.g. a retry landing on another worker
+    Idempotency._cache.clear()
+    assert Idempotency.run("book-ticket:abc", {"fare": 700}, book)[2] is True
+    assert len(calls) == 1
+
+    with pytest.raises(IdempotencyConflict):
+        Idempotency.run("book-ticket:abc", {"fare": 1}, book)
+
+    # Server errors are not stored, so the retry runs again
+    assert Idempotency.run("book-ticket:err", {}, lambda: (500, {"detail": "boom"}))[0] == 500
+    assert Idempotency.run("book-ticket:err", {}, book) == (200, {"booking_reference": "REF2"}, False)
+
+
+
+def test_idempotent_duplicate_waits_for_first_attempt(backend):
+    started, release = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def book():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 200, {"booking_reference": "REF1"}
+
+    first = threading.Thread(target=lambda: results.append(Idempotency.run("book-ticket:dup", {}, book)))
+    first.start()
+    started.wait(5)
+    duplicate = threading.Thread(target=lambda: results.append(Idempotency.run("book-ticket:dup", {}, book)))
+    duplicate.start()
+    time.sleep(0.05)
+    release.set()
+    first.join()
+    duplicate.join()
+
+    assert len(calls) == 1
+    assert sorted(results, key=lambda r: r[2]) == [
+        (200, {"booking_reference": "REF1"}, False), (200, {"booking_reference": "REF1"}, True)
+    ]
+
+
+def test_idempotent_key_held_once_write_commits(catalog, monkeypatch):
+    def book():
+        result = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2099-01-15", 700)
+        return 200, {"booking_reference": result['booking_reference']}
+
+    connect = idempotency.get_db_connection
+    connections = []
+
+    def claim_only():
+        # The claim connects, then storing the response fails
+        connections.append(1)
+        if len(connections) > 1:
+            raise sqlite3.OperationalError("database is locked")
+        return connect()
+
+    monkeypatch.setattr(idempotency, "get_db_connection", claim_only)
+    status_code, body, replayed = Idempotency.run("book-ticket:lease", {}, book)
+    assert status_code == 200 and not replayed
+
+    # Storing the response failed, but this process still replays it
+    assert Idempotency.run("book-ticket:lease", {}, book)[1] == body
+
+    # Elsewhere the committed key is not taken over, even past its lease
+    monkeypatch.setattr(idempotency, "get_db_connection", connect)
+    Idempotency._cache.clear()
+    monkeypatch.setattr(idempotency, "WAIT_SECONDS", 0.1)
+    later = idempotency._now() + timedelta(seconds=idempotency.LEASE_SECONDS + 1)
+    monkeypatch.setattr(idempotency, "_now", lambda: later)
+    with pytest.raises(IdempotencyInProgress):
+        Idempotency.run("book-ticket:lease", {}, book)
+    assert len(Booking.get_by_phone("017")) == 1
+
+
+def test_booking_rollups(catalog):
+    first = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2026-03-01", 700)
+    BookingController.create_booking("Karim", "018", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2026-03-01", 700)
+    BookingController.cancel_booking(first['booking_reference'], "017")
+
+    daily = BookingStats.get_daily(bus_provider="Hanif")
+    assert [(str(d['travel_date']), int(d['confirmed_bookings']), int(d['cancelled_bookings']), int(d['revenue']))
+            for d in daily] == [("2026-03-01", 1, 1, 700)]
+
+    # A rebuild from bookings matches the incrementally maintained rows
+    before = BookingStats.get_provider_totals()
+    BookingStats.rebuild()
+    assert BookingStats.get_provider_totals() == before
+
+
+def test_booking_change_feed(catalog):
+    first = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2026-03-01", 700)
+    BookingController.cancel_booking(first['booking_reference'], "017")
+
+    feed = BookingController.get_changes(0, 100, 0)
+    assert [(c['cursor'], c['event'], c['booking']['status']) for c in feed['changes']] == [
+        (1, "created", "confirmed"), (2, "cancelled", "cancelled")
+    ]
+    assert feed['changes'][1]['booking']['dropping_point'] == "Zindabazar"
+
+    assert BookingController.get_changes(1, 100, 0)['changes'][0]['cursor'] == 2
+    assert BookingController.get_changes(2, 100, 0.05) == {"changes": [], "next_cursor": 2}
+
+
+def _insert_change(seq, created_at):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO booking_changes (seq, event_type, booking_reference, payload, created_at)
+        VALUES (%s, 'created', %s, '{}', %s)
+    """, (seq, f"REF{seq}", created_at))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def test_booking_change_feed_waits_at_gaps(backend):
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    _insert_change(1, now)
+    _insert_change(3, now)
+    # Cursor 2 may still be committing, so readers stop before it
+    assert [c['cursor'] for c in BookingChange.read(0)] == [1]
+    assert BookingChange.read(1) == []
+
+    _insert_change(2, now)
+    assert [c['cursor'] for c in BookingChange.read(0)] == [1, 2, 3]
+
+    # A cursor missing for longer than the timeout was rolled back
+    _insert_change(5, now - timedelta(seconds=60))
+    assert [c['cursor'] for c in BookingChange.read(3)] == [5]
+
+
+def test_booking_changes_migrate_from_counter(backend):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE booking_changes")
+    cursor.execute("""
+        CREATE TABLE booking_changes (
+            seq BIGINT NOT NULL PRIMARY KEY, event_type VARCHAR(20) NOT NULL,
+            booking_reference VARCHAR(20) NOT NULL, payload TEXT NOT NULL, created_at DATETIME NOT NULL
+        )
+    """)
+    cursor.execute("CREATE TABLE booking_change_sequence (id INT NOT NULL PRIMARY KEY, seq BIGINT NOT NULL DEFAULT 0)")
+    cursor.execute("INSERT INTO booking_change_sequence (id, seq) VALUES (1, 7)")
+    cursor.execute("""
+        INSERT INTO booking_changes (seq, event_type, booking_reference, payload, created_at)
+        VALUES (7, 'created', 'OLD7', '{}', %s)
+    """, (datetime.now(timezone.utc).replace(tzinfo=None),))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    init_database()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    seq = BookingChange.record(cursor, "created", {"booking_reference": "NEW"})
+    conn.commit()
+    cursor.close()
+    conn.close()
+    # Existing cursors survive and new ones continue after them
+    assert seq == 8
+    assert [c['booking_reference'] for c in BookingChange.read(6)] == ["OLD7", "NEW"]
+
+
+def test_read_replica_routing(catalog, backend, tmp_path, monkeypatch):
+    if backend.name != "sqlite":
+        pytest.skip("uses a copied SQLite file as a frozen replica")
+
+    # A snapshot of the primary that stops receiving writes, like a stalled replica
+    replica_path = str(tmp_path / "replica.db")
+    source, target = sqlite3.connect(backend.path), sqlite3.connect(replica_path)
+    source.backup(target)
+    source.close()
+    target.close()
+
+    replica = create_backend("sqlite", path=replica_path, read_only=True)
+    lag = [0.0]
+    monkeypatch.setattr(replica, "replication_lag", lambda: lag[0])
+    monkeypatch.setattr(database, "REPLICA_CHECK_INTERVAL", 0)
+    set_replica(replica)
+
+    District.create("Khulna")
+    assert [d['name'] for d in District.get_all()] == ["Dhaka", "Sylhet"]
+    with use_primary():
+        assert "Khulna" in [d['name'] for d in District.get_all()]
+
+    # Writes and read-your-writes lookups stay on the primary
+    booking = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2099-03-01", 700)
+    assert booking['booking']['customer_name'] == "Rahim"
+    assert Booking.get_by_phone("017") == []
+
+    lag[0] = 60.0
+    assert "Khulna" in [d['name'] for d in District.get_all()]
+    assert len(Booking.get_by_phone("017")) == 1
+
+    lag[0] = None
+    assert "Khulna" in [d['name'] for d in District.get_all()]
+
+    conn = replica.get_connection()
+    with pytest.raises(sqlite3.OperationalError):
+        conn.cursor().execute("DELETE FROM districts")
+    conn.close()
+
+
+def test_bootstrap_payload(catalog):
+    payload = BootstrapPayload.current()
+    assert BootstrapPayload.current() is payload
+    assert gzip.decompress(payload.gzipped) == payload.body
+
+    body = json.loads(payload.body)
+    assert [d['name'] for d in body['districts']] == ["Dhaka", "Sylhet"]
+    assert body['coverage']["Hanif"] == ["Dhaka", "Sylhet"]
+    assert "privacy_policy" not in body['providers'][0]
+    assert payload.matches(payload.etag) and payload.matches(f"W/{payload.gzip_etag}")
+    assert not payload.matches('"0-stale"')
+
+    District.create("Khulna")
+    Catalog.refresh_if_stale()
+    assert BootstrapPayload.current().etag != payload.etag
+
+
+def test_bootstrap_endpoint_etags(client):
+    payload = BootstrapPayload.current()
+    zipped = client.get("/bootstrap", headers={"Accept-Encoding": "gzip"})
+    plain = client.get("/bootstrap", headers={"Accept-Encoding": "identity"})
+    assert zipped.headers['content-encoding'] == "gzip" and zipped.headers['etag'] == payload.gzip_etag
+    assert "content-encoding" not in plain.headers and plain.headers['etag'] == payload.etag
+    assert zipped.content == plain.content == payload.body
+
+    # Either tag revalidates, whichever encoding is asked for now
+    revalidated = client.get("/bootstrap", headers={"Accept-Encoding": "identity", "If-None-Match": payload.gzip_etag})
+    assert revalidated.status_code == 304 and revalidated.headers['etag'] == payload.etag
+
+
+def test_archive_past_trips(catalog):
+    old = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2025-01-10", 700)
+    BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2099-03-01", 700)
+    # No-op on SQLite; converts bookings to monthly partitions on MySQL
+    BookingArchive.ensure_partitions()
+    totals = BookingStats.get_provider_totals()
+
+    assert BookingArchive.archive("2025-06-01", batch_size=1) == 1
+    assert BookingArchive.archive("2025-06-01") == 0
+    BookingArchive.drop_archived_partitions("2025-06-01")
+
+    assert [str(b['travel_date']) for b in Booking.get_by_phone("017")] == ["2099-03-01"]
+    archived = Booking.get_by_phone("017", include_archived=True)
+    assert archived[1]['booking_reference'] == old['booking_reference']
+
+    # Rollups rebuilt after archiving still count the archived trips
+    BookingStats.rebuild()
+    assert BookingStats.get_provider_totals() == totals
+
+    # Trips past the horizon but not archived yet only show up with the archive
+    pending = BookingController.create_booking("Rahim", "017", "Dhaka", "Sylhet", "Zindabazar", "Hanif", "2025-08-01", 700)
+    assert pending['booking_reference'] not in [b['booking_reference'] for b in Booking.get_by_phone("017")]
+    assert len(Booking.get_by_phone("017", include_archived=True)) == 3
+
+
+def test_chat_session_reuses_context(catalog):
+    prompts = []
+
+    def complete(model, messages, **kwargs):
+        prompts.append(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Hanif, 700 taka"))], usage=None)
+
+    controller = ChatController()
+    controller.groq_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=complete)))
+
+    first = controller.chat("Hanif buses from Dhaka to Sylhet under 800 taka?")
+    follow_up = controller.chat("what about under 600?", first['session_id'])
+    assert follow_up['session_id'] == first['session_id']
+
+    # The follow-up carries the route, the earlier turn and the provider document
+    system, *history, question = prompts[1]
+    assert "Dhaka, Sylhet" in system['content'] and "Cancellation Policy" in system['content']
+    assert [m['content'] for m in history] == ["Hanif buses from Dhaka to Sylhet under 800 taka?", "Hanif, 700 taka"]
+    assert question['content'] == "what about under 600?"
+
+    assert controller.chat("hello", "expired-or-unknown")['session_id'] != first['session_id']
+
+
+def _admission_client(**overrides):
+    """Admission control around stub endpoints; blocking ones wait for `release`"""
+    limits = {
+        name: {"rate": 100.0, "burst": 100.0, "concurrency": 1, "queue": 0, "wait": 0.0}
+        for name in ("chat", "write", "read", "feed")
+    }
+    for name, values in overrides.items():
+        limits[name].update(values)
+    release = threading.Event()
+
+    def blocking(request):
+        if request.query_params.get("block"):
+            release.wait(5)
+        return JSONResponse({"ok": True})
+
+    async def threads(request):
+        return JSONResponse({"threads": anyio.to_thread.current_default_thread_limiter().total_tokens})
+
+    app = Starlette(routes=[
+        Route("/search", blocking), Route("/chat", blocking, methods=["POST"]), Route("/threads", threads)
+    ])
+    admission = AdmissionControlMiddleware(app, limits=limits)
+    return TestClient(admission), admission, release
+
+
+def _start_blocked(client, admission, endpoint_class, method, path):
+    thread = threading.Thread(target=client.request, args=(method, path + "?block=1"))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while admission.pools[endpoint_class].active == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return thread
+
+
+def test_admission_rate_limit():
+    client, admission, _ = _admission_client(read={"rate": 0.5, "burst": 1})
+    with client:
+        assert client.get("/search").status_code == 200
+        rejected = client.get("/search")
+        assert rejected.status_code == 429
+        assert rejected.headers["Retry-After"] == "2"
+        # Buckets are per endpoint class
+        assert client.post("/chat").status_code == 200
+    assert admission.rejected == {("read", "rate_limited"): 1}
+
+
+def test_admission_client_from_trusted_proxies():
+    scope = {"client": ("10.0.0.2", 5000), "headers": [
+        (b"x-forwarded-for", b"1.1.1.1, 203.0.113.7"), (b"x-forwarded-for", b"10.0.0.1")
+    ]}
+    app = lambda scope, receive, send: None
+    assert AdmissionControlMiddleware(app, trust_forwarded_for=0)._client(scope) == "10.0.0.2"
+    # The entry added by the outermost trusted proxy, never the spoofable leftmost one
+    assert AdmissionControlMiddleware(app, trust_forwarded_for=True)._client(scope) == "10.0.0.1"
+    assert AdmissionControlMiddleware(app, trust_forwarded_for=2)._client(scope) == "203.0.113.7"
+    assert AdmissionControlMiddleware(app, trust_forwarded_for=5)._client(scope) == "1.1.1.1"
+
+
+def test_admission_queue_full_and_timeout():
+    client, admission, release = _admission_client(chat={"queue": 1, "wait": 0.1})
+    with client:
+        blocked = _start_blocked(client, admission, "chat", "POST", "/chat")
+        try:
+            # One slot, one queue place that times out
+            response = client.post("/chat")
+            assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+            blocked_read = _start_blocked(client, admission, "read", "GET", "/search")
+            assert client.get("/search").status_code == 503
+        finally:
+            release.set()
+            blocked.join()
+            blocked_read.join()
+    assert admission.rejected == {("chat", "queue_timeout"): 1, ("read", "queue_full"): 1}
+
+
+def test_admission_classes_do_not_starve_each_other():
+    client, admission, release = _admission_client(chat={"concurrency": 2})
+    with client:
+        # The thread pool is sized to run every class's full pool at once
+        threads = client.get("/threads").json()['threads']
+        assert threads >= admission.thread_budget() == 2 + 1 + 1 + 1 + 8
+
+        chats = [_start_blocked(client, admission, "chat", "POST", "/chat") for _ in range(2)]
+        try:
+            start = time.monotonic()
+            assert client.get("/search").status_code == 200
+            assert time.monotonic() - start < 1
+        finally:
+            release.set()
+            for thread in chats:
+                thread.join()
+
+
+def _sample(metrics_text, name, **labels):
+    """Value of one sample in Prometheus text output, 0 when absent"""
+    label_text = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{name}{{{re.escape(label_text)}}} (\S+)$", metrics_text, re.M)
+    return float(match.group(1)) if match else 0
+
+
+def test_metrics_endpoint(client):
+    before = client.get("/metrics").text
+    assert client.get("/my-bookings/017").status_code == 200
+    assert client.get("/my-bookings/018").status_code == 200
+
+    response = client.get("/metrics")
+    assert response.headers['content-type'].startswith("text/plain")
+    after = response.text
+    labels = {"method": "GET", "route": "/my-bookings/{phone}"}
+    assert _sample(after, "http_requests_total", **labels, status="200") - \
+        _sample(before, "http_requests_total", **labels, status="200") == 2
+    assert _sample(after, "http_request_duration_seconds_count", **labels) - \
+        _sample(before, "http_request_duration_seconds_count", **labels) == 2
+    assert _sample(after, "db_queries_total", method="Booking.get_by_phone") - \
+        _sample(before, "db_queries_total", method="Booking.get_by_phone") == 2
+    assert "# TYPE http_request_duration_seconds histogram" in after
+
+
+def test_query_profiler_headers(client, monkeypatch, caplog):
+    assert "x-db-queries" not in client.get("/my-bookings/017").headers
+
+    monkeypatch.setattr(profiler, "SAMPLE_RATE", 1.0)
+    response = client.get("/my-bookings/017")
+    assert response.headers['x-db-queries'] == "1"
+    assert float(response.headers['x-db-time-ms']) >= 0
+
+    # A method running several statements in one call is not an N+1
+    monkeypatch.setattr(profiler, "REPEAT_THRESHOLD", 2)
+    with caplog.at_level(logging.WARNING, logger="db.profiler"):
+        client.post("/book-ticket", json={
+            "customer_name": "Rahim", "customer_phone": "017", "from_district": "Dhaka",
+            "to_district": "Sylhet", "dropping_point": "Zindabazar", "bus_provider": "Hanif",
+            "travel_date": "2026-01-15", "fare": 700
+        })
+    assert not [message for message in caplog.messages if "N+1" in message]
+
+
+def test_query_profiler_reports_queries_in_a_loop(catalog, monkeypatch, caplog):
+    def provider_details(request):
+        # One lookup per provider: the pattern the profiler should catch
+        providers = [BusProvider.get_by_name(p['name']) for p in BusProvider.get_all()]
+        return JSONResponse({"providers": len(providers)})
+
+    app = QueryProfilerMiddleware(Starlette(routes=[Route("/providers", provider_details)]))
+    monkeypatch.setattr(profiler, "SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(profiler, "REPEAT_THRESHOLD", 2)
+    with caplog.at_level(logging.WARNING, logger="db.profiler"):
+        response = TestClient(app).get("/providers")
+    assert response.headers['x-db-queries'] == "3"
+    assert [message for message in caplog.messages if "N+1" in message] == [
+        "GET /providers: BusProvider.get_by_name was called 2 times in one request (possible N+1)"
+    ]
+
+def test_readyz_waits_for_warmup(backend, monkeypatch):
+    import main
+    gate = threading.Event()
+    monkeypatch.setattr(lifecycle, "_warmups", lifecycle._warmups + [("gate", lambda: gate.wait(5))])
+    # Shutdown closes the backend and the change feed; keep both for the other tests
+    monkeypatch.setattr(lifecycle, "set_backend", lambda backend: None)
+    monkeypatch.setattr(BookingChange, "_closed", False)
+
+    # A second start in the same process warms up again instead of staying stopped
+    for _ in range(2):
+        gate.clear()
+        with TestClient(main.app) as client:
+            assert client.get("/healthz").status_code == 200
+            starting = client.get("/readyz")
+            assert starting.status_code == 503
+            assert starting.json()['status'] == "starting" and "gate" in starting.json()['pending']
+
+            gate.set()
+            assert lifecycle.state.ready.wait(5)
+            assert client.get("/readyz").json() == {"status": "ready"}
+            assert not BookingChange._closed
+        assert BookingChange._closed